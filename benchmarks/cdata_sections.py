@@ -0,0 +1,53 @@
+"""
+Measures the time taken to write texts containing many ']]>' sequences as
+CDATA sections, which used to grow quadratically with their number.
+
+    PYTHONPATH=. python benchmarks/cdata_sections.py [--count 100000]
+"""
+
+import argparse
+import time
+
+from xmlrunner.builder import TestXMLBuilder
+from xmlrunner.dom import LXML, MINIDOM, document_class, etree
+from xmlrunner.result import _XMLTestResult
+
+
+def payloads(count):
+    yield 'only ]]>', ']]>' * count
+    yield 'xml dump', '<a><![CDATA[value]]></a>\n' * count
+    yield 'nested', '<![CDATA[' * count + ']]>' * count
+
+
+def time_result(backend, text):
+    doc = document_class(backend)()
+    node = doc.createElement('system-out')
+    start = time.perf_counter()
+    _XMLTestResult._createCDATAsections(doc, node, text)
+    return time.perf_counter() - start
+
+
+def time_builder(text):
+    builder = TestXMLBuilder()
+    builder.begin_context('testsuite', 'name')
+    start = time.perf_counter()
+    builder.append_cdata_section('system-out', text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    backends = (MINIDOM,) if etree is None else (MINIDOM, LXML)
+    for count in (args.count // 10, args.count):
+        for name, text in payloads(count):
+            timings = ['%s %.3fs' % (backend, time_result(backend, text))
+                       for backend in backends]
+            timings.append('builder %.3fs' % time_builder(text))
+            print('%-9s %8d ]]>  %s' % (name, count, '  '.join(timings)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Compares the size of the XML report of a synthetic result set, and the time
+taken to generate it, with and without indentation.
+
+    PYTHONPATH=. python benchmarks/compact_reports.py [--tests 100000]
+"""
+
+import argparse
+import time
+
+from report_backends import _Runner, make_result
+from xmlrunner.dom import LXML, MINIDOM, etree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    backends = (MINIDOM,) if etree is None else (MINIDOM, LXML)
+    result = make_result(args.tests)
+    for backend in backends:
+        timings = {}
+        sizes = {}
+        for pretty in (True, False):
+            best = None
+            for _ in range(args.repeat):
+                runner = _Runner(backend, pretty)
+                start = time.perf_counter()
+                result.generate_reports(runner)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[pretty] = best
+            sizes[pretty] = len(runner.output.getvalue())
+            print('%-8s %-8s %8.3fs  %10d bytes' % (
+                backend, 'pretty' if pretty else 'compact', best,
+                sizes[pretty]))
+        print('%-8s saved    %7.1f%%  %9.1f%%' % (
+            backend,
+            100 * (1 - timings[False] / timings[True]),
+            100 * (1 - sizes[False] / sizes[True])))
+
+
+if __name__ == '__main__':
+    main()
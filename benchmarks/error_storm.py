@@ -0,0 +1,56 @@
+"""
+Measures the time taken to run and report a suite in which every test fails
+with a traceback a few frames deep, as when a shared fixture is down.
+
+    PYTHONPATH=. python benchmarks/error_storm.py [--tests 20000]
+        [--deduplicate {memory,reference}]
+"""
+
+import argparse
+import io
+import time
+import unittest
+
+import xmlrunner
+from xmlrunner.result import DEDUPLICATIONS
+
+
+def connect(depth):
+    if depth:
+        return connect(depth - 1)
+    raise ConnectionError('could not connect to server: Connection refused')
+
+
+def make_suite(tests, per_class=100):
+    methods = dict(
+        ('test_%d' % i, lambda self: connect(10)) for i in range(per_class))
+    suite = unittest.TestSuite()
+    for start in range(0, tests, per_class):
+        case = type('Case%d' % start, (unittest.TestCase,), methods)
+        for i in range(min(per_class, tests - start)):
+            suite.addTest(case('test_%d' % i))
+    return suite
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=20000)
+    parser.add_argument('--deduplicate', choices=DEDUPLICATIONS)
+    args = parser.parse_args()
+
+    suite = make_suite(args.tests)
+    output = io.BytesIO()
+    runner = xmlrunner.XMLTestRunner(
+        stream=io.StringIO(), output=output, outsuffix='',
+        deduplicate=args.deduplicate)
+    start = time.perf_counter()
+    result = runner.run(suite)
+    elapsed = time.perf_counter() - start
+    print('errors     %10d' % len(result.errors))
+    print('run        %10.2fs' % elapsed)
+    print('per test   %10.1fus' % (elapsed * 1e6 / args.tests))
+    print('report     %10d bytes' % len(output.getvalue()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Measures the time taken to run tests printing many lines with XMLTestRunner,
+with and without --buffer, against a plain unittest.TextTestRunner.
+
+The output echoed to the console is written to os.devnull.
+
+    PYTHONPATH=. python benchmarks/output_capture.py [--tests 2000] [--lines 100]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+
+import xmlrunner
+
+
+def make_suite(tests, lines, per_class=100):
+    def test(self):
+        for i in range(lines):
+            print('line', i)
+            sys.stderr.write('warning\n')
+
+    methods = dict(('test_%d' % i, test) for i in range(per_class))
+    suite = unittest.TestSuite()
+    for start in range(0, tests, per_class):
+        case = type('Case%d' % start, (unittest.TestCase,), methods)
+        for i in range(min(per_class, tests - start)):
+            suite.addTest(case('test_%d' % i))
+    return suite
+
+
+def run(runner, tests, lines):
+    suite = make_suite(tests, lines)
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        start = time.perf_counter()
+        runner().run(suite)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=2000)
+    parser.add_argument('--lines', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for buffer in (False, True):
+        runners = [
+            ('unittest', lambda: unittest.TextTestRunner(
+                stream=io.StringIO(), buffer=buffer)),
+            ('xmlrunner', lambda: xmlrunner.XMLTestRunner(
+                stream=io.StringIO(), output=io.BytesIO(), outsuffix='',
+                buffer=buffer)),
+        ]
+        for name, runner in runners:
+            timing = min(run(runner, args.tests, args.lines)
+                         for _ in range(args.repeat))
+            print('%-10s buffer=%-5s %8.3fs  %6.2fus/line' % (
+                name, buffer, timing,
+                timing * 1e6 / (args.tests * args.lines)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compares the time taken by the report backends to generate the XML report of
+a synthetic result set, in total and per testcase.
+
+    PYTHONPATH=. python benchmarks/report_backends.py [--tests 100000]
+"""
+
+import argparse
+import io
+import sys
+import time
+import unittest
+
+from xmlrunner.dom import LXML, MINIDOM
+from xmlrunner.result import _TestInfo, _XMLTestResult
+
+
+class _Runner(object):
+    outsuffix = ''
+    encoding = 'UTF-8'
+    streaming = False
+    compress = None
+
+    def __init__(self, report_backend, pretty=True):
+        self.output = io.BytesIO()
+        self.report_backend = report_backend
+        self.pretty = pretty
+
+
+def make_result(tests, per_class=100):
+    result = _XMLTestResult(io.StringIO())
+    methods = dict(
+        ('test_%d' % i, lambda self: None) for i in range(per_class))
+    for start in range(0, tests, per_class):
+        case = type('Case%d' % start, (unittest.TestCase,), methods)
+        for i in range(min(per_class, tests - start)):
+            test = case('test_%d' % i)
+            result._stdout_data = 'some output\n' if i % 10 == 0 else ''
+            result._stderr_data = ''
+            if i % 50 == 0:
+                try:
+                    raise AssertionError('failure %d' % i)
+                except AssertionError:
+                    info = _TestInfo(
+                        result, test, _TestInfo.FAILURE, sys.exc_info())
+                result.failures.append((info, info.get_error_info()))
+            else:
+                info = _TestInfo(result, test)
+                result.successes.append(info)
+            info.elapsed_time = 0.001
+            info.timestamp = '2020-01-01T00:00:00'
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    result = make_result(args.tests)
+    timings = {}
+    for backend in (MINIDOM, LXML):
+        best = None
+        for _ in range(args.repeat):
+            runner = _Runner(backend)
+            start = time.perf_counter()
+            result.generate_reports(runner)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[backend] = best
+        print('%-8s %8.3fs  %6.2fus/test  %10d bytes' % (
+            backend, best, best * 1e6 / args.tests,
+            len(runner.output.getvalue())))
+    print('speedup  %8.2fx' % (timings[MINIDOM] / timings[LXML]))
+
+
+if __name__ == '__main__':
+    main()
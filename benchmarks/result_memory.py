@@ -0,0 +1,53 @@
+"""
+Measures the memory kept by the result of a run of passing tests, once the
+tests themselves are released, as the growth of the peak resident set size
+of the process (Unix only).
+
+    PYTHONPATH=. python benchmarks/result_memory.py [--tests 1000000]
+"""
+
+import argparse
+import gc
+import io
+import resource
+import time
+import unittest
+
+from xmlrunner.result import _XMLTestResult
+
+
+def make_cases(tests, per_class=100):
+    methods = dict(
+        ('test_%d' % i, lambda self: None) for i in range(per_class))
+    for start in range(0, tests, per_class):
+        case = type('Case%d' % start, (unittest.TestCase,), methods)
+        for i in range(min(per_class, tests - start)):
+            yield case, 'test_%d' % i
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=1000000)
+    args = parser.parse_args()
+
+    cases = list(make_cases(args.tests))
+    gc.collect()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+
+    result = _XMLTestResult(io.StringIO())
+    for case, name in cases:
+        case(name)(result)
+
+    elapsed = time.perf_counter() - start
+    # kilobytes on Linux
+    retained = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss -
+                baseline) * 1024
+    print('tests      %10d' % len(result.successes))
+    print('retained   %10.1f MB' % (retained / 1e6))
+    print('per test   %10.1f bytes' % (retained / len(result.successes)))
+    print('run        %10.2fs' % elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures the overhead per test of running passing tests without output with
+XMLTestRunner, against a plain unittest.TextTestRunner.
+
+    PYTHONPATH=. python benchmarks/runner_overhead.py [--tests 100000]
+"""
+
+import argparse
+import io
+import time
+import unittest
+
+import xmlrunner
+
+
+def make_suite(tests, per_class=100):
+    methods = dict(
+        ('test_%d' % i, lambda self: None) for i in range(per_class))
+    suite = unittest.TestSuite()
+    for start in range(0, tests, per_class):
+        case = type('Case%d' % start, (unittest.TestCase,), methods)
+        for i in range(min(per_class, tests - start)):
+            suite.addTest(case('test_%d' % i))
+    return suite
+
+
+def run(runner, tests):
+    suite = make_suite(tests)
+    start = time.perf_counter()
+    runner.run(suite)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tests', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    runners = [
+        ('unittest', lambda: unittest.TextTestRunner(stream=io.StringIO())),
+        ('xmlrunner', lambda: xmlrunner.XMLTestRunner(
+            stream=io.StringIO(), output=io.BytesIO(), outsuffix='')),
+    ]
+    timings = {}
+    for name, runner in runners:
+        timings[name] = min(
+            run(runner(), args.tests) for _ in range(args.repeat))
+        print('%-10s %8.3fs  %6.2fus/test' % (
+            name, timings[name], timings[name] * 1e6 / args.tests))
+    print('overhead   %8.3fs  %6.2fus/test' % (
+        timings['xmlrunner'] - timings['unittest'],
+        (timings['xmlrunner'] - timings['unittest']) * 1e6 / args.tests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares the XML sanitizers with the regular expressions they replaced, on
+ASCII, mixed Unicode and control character heavy payloads.
+
+    PYTHONPATH=. python benchmarks/sanitize.py
+"""
+
+import re
+import timeit
+
+from xmlrunner.builder import replace_nontext
+from xmlrunner.result import INVALID_XML_1_0_UNICODE_RE, safe_unicode
+
+
+_old_nontext_sub = re.compile(
+    r'[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]').sub
+
+
+def old_safe_unicode(text):
+    return INVALID_XML_1_0_UNICODE_RE.sub('', text)
+
+
+def old_replace_nontext(text):
+    return _old_nontext_sub(u'\uFFFD', text)
+
+
+TRACEBACK = (
+    'Traceback (most recent call last):\n'
+    '  File "tests/test_module.py", line 42, in test_method\n'
+    '    self.assertEqual(expected, actual)\n'
+    'AssertionError: 1 != 2\n'
+)
+
+PAYLOADS = [
+    ('ascii short', 'test on stdout\n'),
+    ('ascii 100KB', TRACEBACK * (100 * 1024 // len(TRACEBACK))),
+    ('unicode short', u'caf\xe9 € \U0001F600\n'),
+    ('unicode 100KB', u'caf\xe9 € line \U0001F600\n' * 5000),
+    ('control 100KB', u'\x1b[31mred\x1b[0m \x00\x08 done\x0c\n' * 4000),
+    ('unicode+control 100KB', u'\x1b[31mcaf\xe9\x1b[0m €\n' * 6000),
+]
+
+SANITIZERS = [
+    ('safe_unicode', old_safe_unicode, safe_unicode),
+    ('replace_nontext', old_replace_nontext, replace_nontext),
+]
+
+
+def best_of(function, text, number):
+    return min(timeit.repeat(
+        lambda: function(text), number=number, repeat=5)) / number
+
+
+def main():
+    print('%-16s %-22s %12s %12s %8s' % (
+        'function', 'payload', 'before', 'after', 'speedup'))
+    for name, before, after in SANITIZERS:
+        for payload, text in PAYLOADS:
+            number = 100000 if len(text) < 100 else 50
+            old = best_of(before, text, number)
+            new = best_of(after, text, number)
+            print('%-16s %-22s %10.2fus %10.2fus %7.1fx' % (
+                name, payload, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main()
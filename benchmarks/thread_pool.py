@@ -0,0 +1,81 @@
+"""
+Measures the time taken to run a suite mixing I/O-bound and CPU-bound tests
+with XMLTestRunner and with XMLParallelTestRunner, in worker threads and in
+worker processes.
+
+Run it with a regular and a free-threaded (no-GIL) interpreter, e.g.
+python3.13 and python3.13t, to compare them: worker threads only run the
+CPU-bound tests in parallel without the GIL.
+
+    PYTHONPATH=. python benchmarks/thread_pool.py [--classes 20] [--workers 4]
+"""
+
+import argparse
+import io
+import sys
+import sysconfig
+import time
+import unittest
+
+import xmlrunner
+
+
+def make_suite(classes, tests_per_class, work):
+    def test_io(self):
+        time.sleep(work)
+
+    def test_cpu(self):
+        deadline = time.thread_time() + work
+        while time.thread_time() < deadline:
+            sum(i * i for i in range(1000))
+
+    methods = {}
+    for i in range(tests_per_class):
+        methods['test_%d' % i] = test_io if i % 2 else test_cpu
+    suite = unittest.TestSuite()
+    loader = unittest.TestLoader()
+    for i in range(classes):
+        case = type('Case%d' % i, (unittest.TestCase,), methods)
+        suite.addTests(loader.loadTestsFromTestCase(case))
+    return suite
+
+
+def run(runner, args):
+    suite = make_suite(args.classes, args.tests, args.work)
+    start = time.perf_counter()
+    runner.run(suite)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--tests', type=int, default=10,
+                        help='tests per class, half I/O and half CPU bound')
+    parser.add_argument('--work', type=float, default=0.005,
+                        help='seconds spent in each test')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('%s, free-threaded build: %s, GIL enabled: %s' % (
+        sys.version.split()[0],
+        bool(sysconfig.get_config_var('Py_GIL_DISABLED')), gil))
+
+    def kwargs():
+        return dict(stream=io.StringIO(), output=io.BytesIO(),
+                    outsuffix='')
+
+    runners = [
+        ('serial', lambda: xmlrunner.XMLTestRunner(**kwargs())),
+        ('threads', lambda: xmlrunner.XMLParallelTestRunner(
+            workers=args.workers, executor='thread', **kwargs())),
+        ('processes', lambda: xmlrunner.XMLParallelTestRunner(
+            workers=args.workers, **kwargs())),
+    ]
+    for name, runner in runners:
+        print('%-10s %8.3fs' % (name, run(runner(), args)))
+
+
+if __name__ == '__main__':
+    main()
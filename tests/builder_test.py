@@ -200,6 +200,18 @@ class TestXMLBuilderTest(unittest.TestCase):
         self.assertEqual(cdata_container.childNodes[0].data, ']]')
         self.assertEqual(cdata_container.childNodes[1].data, '>')
 
+    def test_append_many_cdata_closing_tags_into_cdata_section(self):
+        content = '<a><![CDATA[value]]></a>' * 1000 + ']]>'
+        self.builder.append_cdata_section('tag', content)
+        self.builder.end_context()
+        cdata_container = self.doc.childNodes[0].childNodes[0]
+        self.assertEqual(len(cdata_container.childNodes), 1002)
+        for cdata in cdata_container.childNodes:
+            self.assertNotIn(']]>', cdata.data)
+        self.assertEqual(
+            ''.join(cdata.data for cdata in cdata_container.childNodes),
+            content)
+
     def test_append_tag_with_valid_unicode_values(self):
         self.builder.append('tag', self.valid_chars, attr=self.valid_chars)
         self.builder.end_context()
@@ -254,3 +266,49 @@ class TestXMLBuilderTest(unittest.TestCase):
 
         self.assertEqual(tree.tag, 'testsuites')
         self.assertEqual(len(tree.findall("./testsuite")), 1)
+
+    def test_finish_compact(self):
+        self.builder.begin_context('testsuite', 'name')
+        self.builder.append('testcase', 'content')
+
+        output = self.builder.finish(pretty=False)
+
+        self.assertNotIn(b'\n', output)
+        self.assertNotIn(b'\t', output)
+        tree = ET.fromstring(output)
+        self.assertEqual(len(tree.findall("./testsuite/testcase")), 1)
+
+
+class SanitizeTest(unittest.TestCase):
+    """replace_nontext and remove_unsafe test cases.
+    """
+
+    samples = [
+        (u'plain text', u'plain text', u'plain text'),
+        (u'lines\n\ttab\r\n', u'lines\n\ttab\r\n', u'lines\n\ttab\r\n'),
+        (u'a\x00b\x08c\x0Bd\x1Fe\x7F', u'a\uFFFDb\uFFFDc\uFFFDd\uFFFDe\x7F',
+         u'abcde'),
+        (u'caf\xe9 \x84\x85\x9F \uFDD0\uFDE0 \uFFFE\U0001F600\U0001FFFF',
+         u'caf\xe9 \x84\x85\x9F \uFDD0\uFDE0 \uFFFD\U0001F600\U0001FFFF',
+         u'caf\xe9 \x85 \uFDE0 \U0001F600'),
+        (u'\ud800surrogate\x0c', u'\uFFFDsurrogate\uFFFD', u'surrogate'),
+    ]
+
+    def test_replace_nontext(self):
+        for text, replaced, _ in self.samples:
+            self.assertEqual(builder.replace_nontext(text), replaced)
+            # long texts are scanned differently
+            self.assertEqual(builder.replace_nontext(text * 100), replaced * 100)
+        self.assertEqual(builder.replace_nontext(u'a\x00b', u'?'), u'a?b')
+        self.assertEqual(
+            builder.replace_nontext(u'a\x00b' * 100, u'?'), u'a?b' * 100)
+
+    def test_remove_unsafe(self):
+        for text, _, removed in self.samples:
+            self.assertEqual(builder.remove_unsafe(text), removed)
+            self.assertEqual(builder.remove_unsafe(text * 100), removed * 100)
+
+    def test_sanitized_text_is_returned_as_is(self):
+        for text in (u'plain text', u'lines\n' * 100, u'caf\xe9\n' * 100):
+            self.assertIs(builder.replace_nontext(text), text)
+            self.assertIs(builder.remove_unsafe(text), text)
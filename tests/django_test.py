@@ -153,3 +153,29 @@ class DjangoTest(unittest.TestCase):
         runner.run_suite(suite)
         
         self.assertTrue(MyDjangoRunner.test_runner.called)
+
+    def test_django_tb_limits(self):
+        from xmlrunner.extra.djangotestrunner import XMLTestRunner
+
+        self._override_settings(
+            TEST_OUTPUT_DIR=self.tmpdir,
+            TEST_OUTPUT_VERBOSE=0,
+            TEST_OUTPUT_TB_MAX_FRAMES=5,
+            TEST_OUTPUT_TB_MAX_LOCAL_REPR=80,
+            TEST_OUTPUT_TB_MAX_SIZE=10000)
+
+        kwargs = XMLTestRunner().get_test_runner_kwargs()
+        self.assertEqual(kwargs['tb_max_frames'], 5)
+        self.assertEqual(kwargs['tb_max_local_repr'], 80)
+        self.assertEqual(kwargs['tb_max_size'], 10000)
+
+    def test_django_tb_limits_unset(self):
+        from xmlrunner.extra.djangotestrunner import XMLTestRunner
+
+        self._override_settings(
+            TEST_OUTPUT_DIR=self.tmpdir,
+            TEST_OUTPUT_VERBOSE=0)
+
+        kwargs = XMLTestRunner().get_test_runner_kwargs()
+        for name in ('tb_max_frames', 'tb_max_local_repr', 'tb_max_size'):
+            self.assertNotIn(name, kwargs)
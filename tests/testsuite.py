@@ -5,15 +5,39 @@
 """
 from __future__ import print_function
 
+import asyncio
 import contextlib
+import functools
+import importlib.util
+import inspect
 import io
+import itertools
+import multiprocessing
+import pickle
+import re
+import subprocess
 import sys
+import threading
+import time
+import traceback
+import types
 
 from xmlrunner.unittest import unittest
 import xmlrunner
+import xmlrunner.dom
 from xmlrunner.result import _DuplicateWriter
+from xmlrunner.result import _BoundedOutputCapture
+from xmlrunner.result import _OutputCapture
+from xmlrunner.result import _SourceIndex
+from xmlrunner.result import _SpilledOutput
+from xmlrunner.result import _TestInfo
+from xmlrunner.result import _TracebackFormatter
 from xmlrunner.result import _XMLTestResult
+from xmlrunner.result import _ReportNames
 from xmlrunner.result import resolve_filename
+from xmlrunner.compression import compress, decompress
+from xmlrunner.parallel import _iter_tests, not_thread_safe
+from xmlrunner.sharding import read_durations, shard_suite
 import doctest
 import tests.doctest_example
 from io import StringIO, BytesIO
@@ -451,6 +475,33 @@ class XMLTestRunnerTestCase(unittest.TestCase):
         output_from_test = r[0].getvalue()
         self.assertNotIn('test message', output_from_test)
 
+    def test_xmlrunner_buffer_shared_with_capture(self):
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_output'))
+        suite.addTest(self.DummyTest('test_runner_buffer_output_fail'))
+        suite.addTest(self.DummyTest('test_output'))
+        self.runner_kwargs['buffer'] = True
+        outdir = BytesIO()
+        with capture_stdout_stderr() as r:
+            self._test_xmlrunner(suite, outdir=outdir)
+        output = outdir.getvalue()
+        # nothing is echoed, the output of the failed test is reported
+        self.assertFalse(r[0].getvalue())
+        self.assertNotIn('test message', self.stream.getvalue())
+        self.assertIn('should be printed', self.stream.getvalue())
+        self.assertEqual(output.count(b'test message'), 2)
+        # in the system-out and the traceback of the failure
+        self.assertEqual(output.count(b'should be printed'), 2)
+
+        result = xmlrunner.result._XMLTestResult(self.stream)
+        result.buffer = True
+        result._setupStdout()
+        try:
+            self.assertIs(sys.stdout, result._stdout_capture)
+            self.assertIs(sys.stderr, result._stderr_capture)
+        finally:
+            result._restoreStdout()
+
     def test_xmlrunner_stdout_stderr_recovered_without_buffer(self):
         orig_stdout = sys.stdout
         orig_stderr = sys.stderr
@@ -727,6 +778,638 @@ class XMLTestRunnerTestCase(unittest.TestCase):
         self.assertIn('test_pass'.encode('utf8'), transformed)
         self.assertIn('test_fail'.encode('utf8'), transformed)
 
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_fail'))
+        suite.addTest(self.DummyTest('test_pass'))
+        suite.properties = None
+        compressed = BytesIO()
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=compressed, verbosity=self.verbosity,
+            compress='xz', **self.runner_kwargs)
+        runner.run(suite)
+        transformed = transform(compressed.getvalue())
+        self.assertTrue(transformed.startswith(b'\xfd7zXZ\x00'))
+        validate_junit_report('ae25da5089d4f94ac6c4669bf736e4d416cc4665', decompress(transformed))
+        transformed = transform(compressed.getvalue(), 'gzip')
+        self.assertTrue(transformed.startswith(b'\x1f\x8b'))
+        transformed = transform(compressed.getvalue(), '')
+        validate_junit_report('ae25da5089d4f94ac6c4669bf736e4d416cc4665', transformed)
+
+    def _streaming_test_suite(self):
+        suite = unittest.TestSuite()
+        for name in ('test_pass', 'test_fail', 'test_skip', 'test_error',
+                     'test_output_stdout_and_stderr', 'test_cdata_section',
+                     'test_unexpected_success'):
+            suite.addTest(self.DummyTest(name))
+        suite.addTest(self.DummySubTest('test_subTest_fail'))
+        suite.addTest(self.DummySubTest('test_subTest_pass'))
+        suite.addTest(self.DummyTest('test_invalid_xml_chars_in_doc'))
+        suite.properties = dict(key='value')
+        return suite
+
+    def _run_report(self, suite=None, **kwargs):
+        # runs `suite`, the streaming test suite by default, to a stream
+        output = BytesIO()
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=output, verbosity=self.verbosity,
+            outsuffix='', **kwargs)
+        if suite is None:
+            suite = self._streaming_test_suite()
+        result = runner.run(suite)
+        return result, output.getvalue()
+
+    def _run_reports(self, name, suite=None, **kwargs):
+        # runs `suite` to the directory `name`, returns the reports by name
+        outdir = os.path.join(self.outdir, name)
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=outdir, verbosity=self.verbosity,
+            outsuffix='', **kwargs)
+        if suite is None:
+            suite = self._streaming_test_suite()
+        runner.run(suite)
+        reports = {}
+        for filename in glob(os.path.join(outdir, 'TEST-*')):
+            with open(filename, 'rb') as report:
+                reports[os.path.basename(filename)] = report.read()
+        return reports
+
+    @staticmethod
+    def _normalize_report(output):
+        # ignores the indentation of the report
+        doc = etree.fromstring(output)
+        for node in doc.iter():
+            node.text = (node.text or '').strip()
+            node.tail = None
+        return etree.tostring(doc)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_streaming_stream(self, _):
+        self.runner_kwargs['outsuffix'] = ''
+        for backend in ('minidom', 'lxml'):
+            outputs = []
+            for streaming in (False, True):
+                outdir = BytesIO()
+                runner = xmlrunner.XMLTestRunner(
+                    stream=self.stream, output=outdir,
+                    verbosity=self.verbosity, streaming=streaming,
+                    report_backend=backend, **self.runner_kwargs)
+                runner.run(self._streaming_test_suite())
+                outputs.append(outdir.getvalue())
+            self.assertEqual(outputs[0], outputs[1])
+            validate_junit_report('14c6e39c38408b9ed6280361484a13c6f5becca7', outputs[1])
+
+    def test_xmlrunner_report_names_per_run(self):
+        # testcases are reported while the tests run when streaming
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+
+        def test_chdir(test):
+            # another result must not reset the names of the run
+            _XMLTestResult()
+            os.chdir(self.outdir)
+        DummyChdirTest = type('DummyChdirTest', (unittest.TestCase,), dict(
+            test_chdir=test_chdir, test_pass=lambda test: None))
+        for kwargs in (dict(), dict(streaming=True),
+                       dict(background_writer=True)):
+            os.chdir(cwd)
+            output = BytesIO()
+            runner = xmlrunner.XMLTestRunner(
+                stream=self.stream, output=output, outsuffix='', **kwargs)
+            runner.run(unittest.TestSuite([
+                DummyChdirTest('test_chdir'), DummyChdirTest('test_pass')]))
+            files = set(re.findall(br' file="([^"]*)"', output.getvalue()))
+            self.assertEqual(files, {b'tests/testsuite.py'}, kwargs)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_streaming_directory(self, _):
+        for backend in ('minidom', 'lxml'):
+            outputs = []
+            for streaming in (False, True):
+                outdir = os.path.join(self.outdir, backend, str(streaming))
+                runner = xmlrunner.XMLTestRunner(
+                    stream=self.stream, output=outdir,
+                    verbosity=self.verbosity, streaming=streaming,
+                    report_backend=backend, outsuffix='',
+                    **self.runner_kwargs)
+                result = runner.run(self._streaming_test_suite())
+                reports = {}
+                for filename in glob(os.path.join(outdir, '*.xml')):
+                    with open(filename, 'rb') as report:
+                        reports[os.path.basename(filename)] = report.read()
+                outputs.append(reports)
+            self.assertEqual(2, len(outputs[1]))
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual([], result.successes)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_report_workers(self, _):
+        expected = self._run_reports('sequential')
+        self.assertEqual(2, len(expected))
+        self.assertEqual(
+            expected, self._run_reports('threads', report_workers=4))
+        self.assertEqual(expected, self._run_reports(
+            'processes', report_workers=2, report_executor='process'))
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_report_workers_local_class(self, _):
+        # local classes cannot be sent to the report processes
+        class LocalTest(unittest.TestCase):
+            def test_pass(self):
+                pass
+
+            def test_fail(self):
+                self.fail('local failure')
+
+        def run(name, **kwargs):
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_pass'))
+            suite.addTest(LocalTest('test_pass'))
+            suite.addTest(LocalTest('test_fail'))
+            return self._run_reports(name, suite, **kwargs)
+
+        expected = run('sequential')
+        self.assertEqual(2, len(expected))
+        self.assertEqual(expected, run(
+            'processes', report_workers=2, report_executor='process'))
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_background_writer(self, _):
+        def run(name, **kwargs):
+            suite = self._streaming_test_suite()
+            # DummyTest is reported again after another testsuite
+            suite.addTest(self.DummyTest('test_pass'))
+            return self._run_reports(name, suite, **kwargs)
+
+        expected = run('sequential')
+        self.assertEqual(2, len(expected))
+        self.assertEqual(expected, run('background', background_writer=True))
+
+    def test_xmlrunner_background_writer_during_run(self):
+        outdir = self.outdir
+
+        class WaitForReport(unittest.TestCase):
+            def test_wait(self):
+                pattern = os.path.join(outdir, 'TEST-*DummyTest*.xml')
+                deadline = time.monotonic() + 10
+                while not glob(pattern):
+                    if time.monotonic() > deadline:  # pragma: no cover
+                        self.fail('DummyTest report was not written')
+                    time.sleep(0.01)
+
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_pass'))
+        suite.addTest(WaitForReport('test_wait'))
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=outdir, verbosity=self.verbosity,
+            background_writer=True)
+        result = runner.run(suite)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(2, len(glob(os.path.join(outdir, '*.xml'))))
+
+    def test_xmlrunner_background_writer_streaming(self):
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLTestRunner(
+                stream=self.stream, output=self.outdir,
+                streaming=True, background_writer=True)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_report_backends(self, _):
+        outputs = [
+            self._run_report(report_backend=backend)[1]
+            for backend in ('minidom', 'lxml')]
+        self.assertTrue(outputs[1].startswith(
+            b'<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n\t<testsuite'))
+        self.assertEqual(self._normalize_report(outputs[0]),
+                         self._normalize_report(outputs[1]))
+
+    def test_xmlrunner_report_backends_old_lxml(self):
+        # lxml < 4.5 has no etree.indent: minidom is used instead
+        old_etree = types.ModuleType('lxml.etree')
+        old_lxml = types.ModuleType('lxml')
+        old_lxml.etree = old_etree
+        spec = importlib.util.spec_from_file_location(
+            'xmlrunner._old_lxml_dom', xmlrunner.dom.__file__)
+        dom = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(
+                'sys.modules', {'lxml': old_lxml, 'lxml.etree': old_etree}):
+            spec.loader.exec_module(dom)
+        self.assertIsNone(dom.etree)
+        self.assertIs(dom.document_class(), dom.MinidomDocument)
+        with self.assertRaises(ValueError):
+            dom.document_class('lxml')
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_compact(self, _):
+        def run(**kwargs):
+            return self._run_report(**kwargs)[1]
+
+        for backend in ('minidom', 'lxml'):
+            pretty = run(report_backend=backend)
+            compact = run(report_backend=backend, pretty=False)
+            self.assertTrue(compact.startswith(
+                b'<?xml version="1.0" encoding="UTF-8"?><testsuites><testsuite'))
+            self.assertLess(len(compact), len(pretty))
+            self.assertEqual(self._normalize_report(pretty),
+                             self._normalize_report(compact))
+            self.assertEqual(compact, run(
+                report_backend=backend, pretty=False, streaming=True))
+            validate_junit_report('14c6e39c38408b9ed6280361484a13c6f5becca7', compact)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_compress_directory(self, _):
+        expected = self._run_reports('plain')
+        self.assertEqual(2, len(expected))
+        for compression, suffix in (('gzip', '.gz'), ('xz', '.xz'),
+                                    ('bz2', '.bz2')):
+            for streaming in (False, True):
+                reports = self._run_reports(
+                    '%s-%s' % (compression, streaming),
+                    compress=compression, streaming=streaming)
+                self.assertEqual(
+                    sorted(name + suffix for name in expected),
+                    sorted(reports))
+                for name in expected:
+                    self.assertNotEqual(expected[name], reports[name + suffix])
+                    self.assertEqual(
+                        expected[name], decompress(reports[name + suffix]))
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_compress_stream(self, _):
+        outputs = [
+            self._run_report(compress=compression)[1]
+            for compression in (None, 'gzip')]
+        self.assertTrue(outputs[1].startswith(b'\x1f\x8b'))
+        self.assertEqual(outputs[0], decompress(outputs[1]))
+
+    def test_xmlrunner_unknown_compress(self):
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLTestRunner(
+                stream=self.stream, output=self.outdir, compress='zip')
+
+    def _repeated_failure_suite(self):
+        def test_down(test):
+            print('connecting to the server')
+            raise ConnectionError('the server is down')
+        DummyDownTest = type('DummyDownTest', (unittest.TestCase,), dict(
+            test_1=test_down, test_2=test_down, test_3=test_down))
+        return unittest.TestSuite(
+            DummyDownTest(name) for name in ('test_1', 'test_2', 'test_3'))
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_deduplicate(self, _):
+        def run(**kwargs):
+            return self._run_report(self._repeated_failure_suite(), **kwargs)
+
+        _, expected = run()
+        result, output = run(deduplicate='memory')
+        self.assertEqual(output, expected)
+        tracebacks = [error for _, error in result.errors]
+        self.assertIs(tracebacks[0], tracebacks[2])
+        infos = [info for info, _ in result.errors]
+        self.assertIs(infos[0].test_exception_info,
+                      infos[2].test_exception_info)
+        self.assertIs(infos[0].stdout, infos[2].stdout)
+
+        result, output = run(deduplicate='reference')
+        self.assertEqual(
+            [error for _, error in result.errors], tracebacks)
+        self.assertEqual(
+            output.count(b'ConnectionError: the server is down'), 1)
+        self.assertEqual(output.count(b'[same traceback as '), 2)
+        # short outputs are kept
+        self.assertEqual(output.count(b'connecting to the server'), 3)
+        self.assertIn('REPEATED TRACEBACKS', self.stream.getvalue())
+        self.assertIn('3 tests: [same traceback as ', self.stream.getvalue())
+        minidom.parseString(output)
+
+    def test_xmlrunner_unknown_deduplicate(self):
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLTestRunner(
+                stream=self.stream, output=self.outdir, deduplicate='disk')
+
+    def test_xmlrunner_tb_limits(self):
+        def test_locals(test):
+            big_list = list(range(100000))
+            big_text = 'x' * 100000
+            test.fail('with locals')
+        DummyLocalsTest = type('DummyLocalsTest', (unittest.TestCase,), dict(
+            test_locals=test_locals))
+        output = BytesIO()
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=output, verbosity=self.verbosity,
+            tb_locals=True, tb_max_local_repr=20, tb_max_size=1000,
+            **self.runner_kwargs)
+        result = runner.run(unittest.TestSuite(
+            [DummyLocalsTest('test_locals')]))
+        traceback = result.failures[0][1]
+        self.assertIn("big_text = 'xxxxxxx...xxxxxxxx'\n", traceback)
+        self.assertIn('big_list = [0, 1, 2, 3, 4, 5...\n', traceback)
+        self.assertLess(len(traceback), 1100)
+        self.assertIn(b'big_list = [0, 1, 2, 3, 4, 5...', output.getvalue())
+
+    def _run_fd_output_test(self, **kwargs):
+        def test_fd_output(test):
+            print(u'python café')
+            os.write(1, b'fd stdout\n')
+            os.write(2, b'fd stderr\n')
+            subprocess.check_call([
+                sys.executable, '-c', 'print("child stdout")'])
+        DummyFdTest = type('DummyFdTest', (unittest.TestCase,), dict(
+            test_fd_output=test_fd_output))
+        output = BytesIO()
+        kwargs.setdefault('stream', self.stream)
+        kwargs.setdefault('verbosity', self.verbosity)
+        runner = xmlrunner.XMLTestRunner(
+            output=output, capture_fd=True, **kwargs)
+        runner.run(unittest.TestSuite([DummyFdTest('test_fd_output')]))
+        return output.getvalue()
+
+    def test_xmlrunner_capture_fd(self):
+        stdout, stderr = os.fstat(1), os.fstat(2)
+        with capture_stdout_stderr():
+            output = self._run_fd_output_test(buffer=True)
+        self.assertEqual(os.fstat(1), stdout)
+        self.assertEqual(os.fstat(2), stderr)
+        doc = minidom.parseString(output)
+        system_out, = doc.getElementsByTagName('system-out')
+        self.assertEqual(
+            system_out.firstChild.data,
+            u'python café\nfd stdout\nchild stdout\n')
+        system_err, = doc.getElementsByTagName('system-err')
+        self.assertEqual(system_err.firstChild.data, 'fd stderr\n')
+
+    def test_xmlrunner_capture_fd_echo(self):
+        saved = os.dup(1)
+        try:
+            with open(os.path.join(self.outdir, 'console'), 'w+b') as console:
+                os.dup2(console.fileno(), 1)
+                try:
+                    output = self._run_fd_output_test()
+                finally:
+                    os.dup2(saved, 1)
+                console.seek(0)
+                echoed = console.read()
+        finally:
+            os.close(saved)
+        self.assertEqual(
+            echoed,
+            u'python café\nfd stdout\nchild stdout\n'.encode('utf8'))
+        self.assertIn(b'child stdout', output)
+
+    def test_xmlrunner_capture_fd_console_stream(self):
+        # the runner writes its progress to the console, fd 2
+        saved = os.dup(2)
+        try:
+            with open(os.path.join(self.outdir, 'console'), 'w+b') as console:
+                os.dup2(console.fileno(), 2)
+                try:
+                    with open(2, 'w', closefd=False) as stderr, \
+                            mock.patch('sys.stderr', stderr):
+                        output = self._run_fd_output_test(
+                            buffer=True, stream=sys.stderr, verbosity=2)
+                finally:
+                    os.dup2(saved, 2)
+                console.seek(0)
+                echoed = console.read()
+        finally:
+            os.close(saved)
+        doc = minidom.parseString(output)
+        system_err, = doc.getElementsByTagName('system-err')
+        self.assertEqual(system_err.firstChild.data, 'fd stderr\n')
+        self.assertIn(b'test_fd_output', echoed)
+        self.assertIn(b' ... ok', echoed)
+        self.assertNotIn(b'fd stderr', echoed)
+
+    def test_xmlrunner_route_output(self):
+        barrier = threading.Barrier(2, timeout=10)
+
+        def test_print(test):
+            name = threading.current_thread().name
+            for i in range(100):
+                print(name, i)
+                sys.stderr.write(name + '\n')
+                if i % 10 == 0:
+                    barrier.wait()
+        DummyThreadTest = type('DummyThreadTest', (unittest.TestCase,), dict(
+            test_print=test_print))
+
+        def run(buffer):
+            result = _XMLTestResult(StringIO())
+            result.buffer = buffer
+            result.route_output()
+            unittest.TestSuite([DummyThreadTest('test_print')])(result)
+            results.append(result)
+
+        orig_stdout = sys.stdout
+        orig_stderr = sys.stderr
+        results = []
+        with capture_stdout_stderr() as r:
+            threads = [
+                threading.Thread(target=run, args=(buffer,), name=name)
+                for buffer, name in ((False, 'first'), (True, 'second'))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertIs(orig_stdout, sys.stdout)
+        self.assertIs(orig_stderr, sys.stderr)
+        for result in results:
+            test_info, = result.successes
+            name = test_info.stdout.split()[0]
+            self.assertEqual(
+                test_info.stdout,
+                ''.join('%s %d\n' % (name, i) for i in range(100)))
+            self.assertEqual(test_info.stderr, (name + '\n') * 100)
+        # the output of the test not buffered is echoed
+        self.assertEqual(
+            r[0].getvalue(),
+            ''.join('first %d\n' % i for i in range(100)))
+
+    def test_xmlrunner_route_output_other_threads(self):
+        started = threading.Event()
+        done = threading.Event()
+
+        def background():
+            started.wait(10)
+            print('background')
+            done.set()
+
+        def test_print(test):
+            started.set()
+            done.wait(10)
+            print('test')
+        DummyThreadTest = type('DummyThreadTest', (unittest.TestCase,), dict(
+            test_print=test_print))
+        result = _XMLTestResult(StringIO())
+        result.route_output()
+        thread = threading.Thread(target=background)
+        with capture_stdout_stderr() as r:
+            thread.start()
+            unittest.TestSuite([DummyThreadTest('test_print')])(result)
+            thread.join()
+        test_info, = result.successes
+        self.assertEqual(test_info.stdout, 'test\n')
+        self.assertEqual(r[0].getvalue(), 'background\ntest\n')
+
+    def test_xmlrunner_route_output_fd_capture(self):
+        result = _XMLTestResult(StringIO())
+        result.route_output()
+        self.assertRaises(ValueError, result.capture_fds)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_output_spill_threshold(self, _):
+        run = self._run_report
+        for backend in ('minidom', 'lxml'):
+            _, expected = run(
+                self._streaming_test_suite(), report_backend=backend)
+            for kwargs in (dict(), dict(streaming=True)):
+                result, output = run(
+                    self._streaming_test_suite(), report_backend=backend,
+                    output_spill_threshold=5, **kwargs)
+                self.assertEqual(self._normalize_report(expected),
+                                 self._normalize_report(output))
+
+            # outputs without ']]>' are reported exactly the same way
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_output_stdout_and_stderr'))
+            suite.addTest(self.DummyTest('test_unsafe_unicode'))
+            _, expected = run(suite, report_backend=backend)
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_output_stdout_and_stderr'))
+            suite.addTest(self.DummyTest('test_unsafe_unicode'))
+            result, output = run(
+                suite, report_backend=backend, output_spill_threshold=5)
+            self.assertEqual(expected, output)
+            self.assertIsInstance(result.successes[0].stdout, _SpilledOutput)
+            self.assertEqual('test on stdout\n',
+                             str(result.successes[0].stdout))
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_output_spill_threshold_directory(self, _):
+        def run(name, **kwargs):
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_output_stdout_and_stderr'))
+            suite.addTest(self.DummyTest('test_output'))
+            suite.addTest(self.DummySubTest('test_subTest_pass'))
+            return self._run_reports(name, suite, **kwargs)
+
+        expected = run('memory')
+        self.assertEqual(2, len(expected))
+        for name, kwargs in (
+                ('background', dict(background_writer=True)),
+                ('processes', dict(report_workers=2,
+                                   report_executor='process'))):
+            self.assertEqual(expected, run(
+                name, output_spill_threshold=0, **kwargs))
+
+    def test_xmlrunner_output_spill_threshold_buffer(self):
+        # unittest adds the buffered output of failed tests to tracebacks
+        for kwargs in (dict(), dict(streaming=True),
+                       dict(background_writer=True)):
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_runner_buffer_output_fail'))
+            result, output = self._run_report(
+                suite, buffer=True, output_spill_threshold=10, **kwargs)
+            self.assertEqual(1, len(result.failures), kwargs)
+            self.assertIn('Stdout:\nshould be printed\n',
+                          result.failures[0][1])
+            self.assertIn(b'should be printed', output)
+
+    def test_spilled_output_chunks(self):
+        text = u'caf\xe9 ]]>]]]>>]]] ]]>\x0c\u20ac]]'
+        capture = _OutputCapture(4)
+        for char in text:
+            capture.write(char)
+        output = capture.getvalue()
+        self.assertIsInstance(output, _SpilledOutput)
+        self.assertEqual(text, str(output))
+
+        for chunk_size in (1, 2, 3, 5, 64):
+            with mock.patch.object(_SpilledOutput, '_CHUNK_SIZE', chunk_size):
+                self.assertEqual(text, ''.join(output.chunks()))
+                doc = xmlrunner.result.document_class('minidom')()
+                element = doc.createElement('system-out')
+                doc.appendChild(element)
+                _XMLTestResult._createCDATAsections(doc, element, output)
+                stream = BytesIO()
+                xmlrunner.result._write_content(
+                    doc.toxml(encoding='UTF-8'), stream, doc, 'UTF-8')
+                expected = xmlrunner.result.document_class('minidom')()
+                element = expected.createElement('system-out')
+                expected.appendChild(element)
+                _XMLTestResult._createCDATAsections(expected, element, text)
+                self.assertEqual(
+                    expected.toxml(encoding='UTF-8'), stream.getvalue())
+
+        capture.seek(0)
+        capture.truncate()
+        capture.write(u'abc')
+        self.assertEqual(u'abc', capture.getvalue())
+
+    def test_bounded_output_capture(self):
+        text = ''.join('line %d\n' % i for i in range(1000))
+        for head, tail in ((10, 20), (0, 20), (10, 0), (0, 0), (5, 10000)):
+            for chunk_size in (1, 7, 100, len(text)):
+                capture = _BoundedOutputCapture(head, tail)
+                for pos in range(0, len(text), chunk_size):
+                    capture.write(text[pos:pos + chunk_size])
+                dropped = len(text) - head - tail
+                if dropped > 0:
+                    expected = '%s\n[... %d characters dropped ...]\n%s' % (
+                        text[:head], dropped, text[len(text) - tail:])
+                else:
+                    expected = text
+                self.assertEqual(expected, capture.getvalue())
+                capture.seek(0)
+                capture.truncate()
+                capture.write('short')
+                fresh = _BoundedOutputCapture(head, tail)
+                fresh.write('short')
+                self.assertEqual(fresh.getvalue(), capture.getvalue())
+
+    def test_xmlrunner_output_head_tail_size(self):
+        class Verbose(unittest.TestCase):
+            def test_loop(self):
+                for i in range(10000):
+                    print('log line %d' % i)
+
+        outdir = BytesIO()
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=outdir, verbosity=self.verbosity,
+            output_head_size=100, output_tail_size=50, **self.runner_kwargs)
+        result = runner.run(Verbose('test_loop'))
+        output = result.successes[0].stdout
+        self.assertTrue(output.startswith('log line 0\n'))
+        self.assertTrue(output.endswith('log line 9999\n'))
+        self.assertIn(' characters dropped ...]', output)
+        self.assertLess(len(outdir.getvalue()), 2000)
+
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLTestRunner(
+                stream=self.stream, output=self.outdir,
+                output_spill_threshold=10, output_tail_size=10)
+
+    def test_cdata_sections_many_closing_tags(self):
+        text = '<a><![CDATA[value]]></a>\n' * 1000 + ']]>'
+        for backend in ('minidom', 'lxml'):
+            with self.subTest(backend=backend):
+                doc = xmlrunner.result.document_class(backend)()
+                element = doc.createElement('system-out')
+                doc.appendChild(element)
+                _XMLTestResult._createCDATAsections(doc, element, text)
+                parsed = minidom.parseString(doc.toxml(encoding='utf-8'))
+                self.assertEqual(
+                    ''.join(node.data for node in
+                            parsed.documentElement.childNodes),
+                    text)
+
+    def test_xmlrunner_unknown_report_backend(self):
+        self.runner_kwargs['report_backend'] = 'unknown'
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_pass'))
+        with self.assertRaises(ValueError):
+            self._test_xmlrunner(suite)
+
     def test_xmlrunner_elapsed_times(self):
         self.runner_kwargs['elapsed_times'] = False
         suite = unittest.TestSuite()
@@ -742,6 +1425,113 @@ class XMLTestRunnerTestCase(unittest.TestCase):
         self.runner_kwargs['resultclass'] = Result
         self._test_xmlrunner(suite)
 
+    def test_xmlrunner_test_info_records(self):
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_pass'))
+        suite.addTest(self.DummyTest('test_fail'))
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=BytesIO(), verbosity=self.verbosity,
+            **self.runner_kwargs)
+        result = runner.run(suite)
+        success = result.successes[0]
+        failure = result.failures[0][0]
+        self.assertFalse(hasattr(success, '__dict__'))
+        self.assertIsNone(success.test_result)
+        self.assertIsNone(failure.test_result)
+        self.assertIs(success.test_name, failure.test_name)
+        self.assertIs(success.filename, failure.filename)
+
+    def test_xmlrunner_infoclass(self):
+        class TestInfo(_TestInfo):
+            def __init__(self, *args, **kwargs):
+                super(TestInfo, self).__init__(*args, **kwargs)
+                self.extra = 'extra'
+
+        class Result(_XMLTestResult):
+            def __init__(self, *args, **kwargs):
+                kwargs['infoclass'] = TestInfo
+                super(Result, self).__init__(*args, **kwargs)
+
+        suite = unittest.TestSuite()
+        suite.addTest(self.DummyTest('test_pass'))
+        self.runner_kwargs['resultclass'] = Result
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=BytesIO(), verbosity=self.verbosity,
+            **self.runner_kwargs)
+        result = runner.run(suite)
+        test_info = result.successes[0]
+        self.assertIsInstance(test_info, TestInfo)
+        self.assertEqual('extra', test_info.extra)
+        state = test_info.__getstate__()
+        self.assertEqual('extra', state['extra'])
+        self.assertEqual(test_info.test_id, state['test_id'])
+        copy = TestInfo.__new__(TestInfo)
+        copy.__setstate__(state)
+        self.assertEqual('extra', copy.extra)
+        self.assertEqual(test_info.test_id, copy.id())
+
+    def test_xmlrunner_grouped_testsuites(self):
+        suite = unittest.TestSuite()
+        for name in ('test_pass', 'test_fail', 'test_skip', 'test_error',
+                     'test_expected_failure', 'test_unexpected_success',
+                     'test_pass'):
+            suite.addTest(self.DummyTest(name))
+        suite.addTest(self.DummySubTest('test_subTest_mixed'))
+        suite.addTest(self.DummyTest('test_output'))
+        runner = xmlrunner.XMLTestRunner(
+            stream=self.stream, output=BytesIO(), verbosity=self.verbosity,
+            **self.runner_kwargs)
+        result = runner.run(suite)
+
+        grouped = result._get_info_by_testcase()
+        summaries = result.testsuite_summaries()
+        # regroup the result lists
+        result._grouped_tests = None
+        self.assertIsNone(result.testsuite_summaries())
+        expected = result._get_info_by_testcase()
+        self.assertEqual(list(grouped), list(expected))
+        for name, test_infos in expected.items():
+            self.assertEqual(grouped[name], test_infos)
+            summary = xmlrunner.result._TestSuiteSummary(test_infos)
+            for total in ('tests', 'timestamp', 'failures', 'errors',
+                          'skipped'):
+                self.assertEqual(getattr(summaries[name], total),
+                                 getattr(summary, total))
+            self.assertAlmostEqual(summaries[name].time, summary.time)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_xmlrunner_passed_fast_path(self, _):
+        class Result(_XMLTestResult):
+            def __init__(self, *args, **kwargs):
+                # any other infoclass disables the fast path
+                kwargs['infoclass'] = type('TestInfo', (_TestInfo,), {})
+                super(Result, self).__init__(*args, **kwargs)
+
+        def run(**kwargs):
+            suite = unittest.TestSuite()
+            suite.addTest(self.DummyTest('test_pass'))
+            suite.addTest(self.DummyTest('test_output_stdout_and_stderr'))
+            suite.addTest(self.DummyTest('test_fail'))
+            output = BytesIO()
+            runner = xmlrunner.XMLTestRunner(
+                stream=StringIO(), output=output, verbosity=2,
+                outsuffix='', **kwargs)
+            result = runner.run(suite)
+            return result, output.getvalue()
+
+        result, output = run()
+        self.assertEqual(type(result.successes[0]), _TestInfo)
+        # the description of the passed test is computed when used
+        self.assertIsNotNone(result.successes[0]._describe)
+        self.assertEqual(result.successes[0].test_description,
+                         result.getDescription(self.DummyTest('test_pass')))
+        self.assertIsNotNone(result.successes[1].test_description)
+        passed = pickle.loads(pickle.dumps(result.successes[0]))
+        self.assertEqual(passed.test_description,
+                         result.successes[0].test_description)
+        _, expected = run(resultclass=Result)
+        self.assertEqual(output, expected)
+
     def test_xmlrunner_stream(self):
         stream = self.stream
         output = BytesIO()
@@ -903,6 +1693,476 @@ class XMLTestRunnerTestCase(unittest.TestCase):
         suite.addTest(TestWithPartialmethod('test_partialmethod'))
         self._test_xmlrunner(suite)
 
+    def test_source_index(self):
+        def wrapped(test):
+            pass
+
+        class Test(unittest.TestCase):
+            @functools.wraps(wrapped)
+            def test_wraps(self):
+                pass
+
+            @unittest.skip('reason')
+            def test_skip(self):
+                pass
+
+            test_partial = functools.partial(wrapped)
+
+        index = _SourceIndex()
+        self.assertEqual(index.filename(Test), inspect.getsourcefile(Test))
+        for function in (self.DummyTest.test_pass, Test.test_wraps,
+                         Test.test_skip, Test.test_partial.func):
+            self.assertEqual(index.lineno(function),
+                             inspect.getsourcelines(function)[1])
+        with self.assertRaises(OSError):
+            index.lineno(self.DecoratedUnitTest.test_pass)
+        with self.assertRaises(TypeError):
+            index.lineno(len)
+
+
+
+@unittest.skipIf('fork' not in multiprocessing.get_all_start_methods(),
+                 'the fork start method is not available.')
+class XMLParallelTestRunnerTestCase(unittest.TestCase):
+    class DummyTest(unittest.TestCase):
+        def test_pass(self):
+            pass
+
+        def test_output(self):
+            print('test message')
+            sys.stderr.write('error message\n')
+
+        def test_fail(self):
+            self.fail('expected to fail')
+
+        def test_error(self):
+            raise Exception('expected error')
+
+        @unittest.skip('skipped')
+        def test_skip(self):
+            pass
+
+        @unittest.expectedFailure
+        def test_expected_failure(self):
+            self.fail('expected to fail')
+
+        def test_subTest(self):
+            for i in range(2):
+                with self.subTest(i=i):
+                    self.assertEqual(i, 0)
+
+    class DummySetUpClassTest(unittest.TestCase):
+        @classmethod
+        def setUpClass(cls):
+            cls.setup_pid = os.getpid()
+
+        def test_pid(self):
+            print('setUpClass', self.setup_pid, 'test', os.getpid())
+
+        test_pid_2 = test_pid
+
+    class DummyCrashTest(unittest.TestCase):
+        def test_before(self):
+            pass
+
+        def test_crash(self):
+            os._exit(3)
+
+        def test_after(self):
+            pass
+
+    def setUp(self):
+        self.stream = StringIO()
+
+    def _suite(self, *tests):
+        loader = unittest.TestLoader()
+        return unittest.TestSuite(
+            loader.loadTestsFromTestCase(test) for test in tests)
+
+    def _run(self, runner_class, suite, **kwargs):
+        output = BytesIO()
+        runner = runner_class(
+            stream=self.stream, output=output, outsuffix='', buffer=True,
+            **kwargs)
+        result = runner.run(suite)
+        return result, output.getvalue()
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_same_report(self, _):
+        tests = (self.DummyTest, self.DummySetUpClassTest)
+        expected_result, expected = self._run(
+            xmlrunner.XMLTestRunner, self._suite(*tests))
+        expected_stream = self.stream.getvalue()
+        self.stream = StringIO()
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests), workers=1)
+
+        def normalize(output):
+            output = re.sub(br'(setUpClass|test) \d+', br'\1 <pid>', output)
+            return re.sub(br' at 0x[0-9a-f]+', b'', output)
+
+        def normalize_stream(stream):
+            return re.sub(r'in \d+\.\d+s', 'in <time>', stream)
+
+        self.assertEqual(normalize(output), normalize(expected))
+        self.assertEqual(normalize_stream(self.stream.getvalue()),
+                         normalize_stream(expected_stream))
+        self.assertEqual(result.testsRun, expected_result.testsRun)
+
+    def _timed_report(self, runner_class, **kwargs):
+        # each test takes 0.25s
+        tests = (self.DummyTest, self.DummySetUpClassTest)
+        with mock.patch('xmlrunner.result.time',
+                        side_effect=itertools.count(1, 0.25)):
+            result, output = self._run(
+                runner_class, self._suite(*tests), **kwargs)
+        output = re.sub(br'(setUpClass|test) \d+', br'\1 <pid>', output)
+        return re.sub(br' at 0x[0-9a-f]+', b'', output)
+
+    def test_same_report_times(self):
+        expected = self._timed_report(xmlrunner.XMLTestRunner)
+        self.assertIn(b'tests="7" file="tests/testsuite.py" time="1.750"', expected)
+        for executor in xmlrunner.parallel.EXECUTORS:
+            output = self._timed_report(
+                xmlrunner.XMLParallelTestRunner, workers=1, executor=executor)
+            self.assertEqual(output, expected, executor)
+        output = self._timed_report(
+            xmlrunner.XMLTestRunner, async_concurrency=2)
+        self.assertEqual(output, expected)
+
+    def test_workers(self):
+        tests = (self.DummySetUpClassTest,) * 4
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests), workers=2)
+        self.assertEqual(result.testsRun, 8)
+        self.assertEqual(len(result.successes), 8)
+        pids = set()
+        for test_info in result.successes:
+            setup_pid, test_pid = re.findall(r'\d+', test_info.stdout)
+            self.assertEqual(setup_pid, test_pid)
+            pids.add(test_pid)
+        self.assertNotIn(str(os.getpid()), pids)
+        doc = minidom.parseString(output)
+        testsuite, = doc.getElementsByTagName('testsuite')
+        self.assertEqual(testsuite.getAttribute('tests'), '8')
+
+    def test_worker_crash(self):
+        tests = (self.DummyCrashTest, self.DummyTest)
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests), workers=2)
+        self.assertEqual(result.testsRun, 10)
+        errors = dict((test_info.test_id, error_info)
+                      for test_info, error_info in result.errors)
+        self.assertIn('exited with code 3',
+                      errors[self.DummyCrashTest('test_crash').id()])
+        test_ids = [test_info.test_id for test_info in result.successes]
+        self.assertIn(self.DummyCrashTest('test_after').id(), test_ids)
+        self.assertIn(b'exited with code 3', output)
+
+    def test_failfast(self):
+        tests = (self.DummyCrashTest, self.DummyTest)
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests), workers=1,
+            failfast=True)
+        self.assertTrue(result.shouldStop)
+        self.assertEqual(len(result.errors), 1)
+        # test_after, test_before and test_crash
+        self.assertEqual(result.testsRun, 3)
+
+    def test_invalid_workers(self):
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLParallelTestRunner(workers=0)
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLParallelTestRunner(executor='fiber')
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLParallelTestRunner(executor='thread', capture_fd=True)
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLParallelTestRunner(async_concurrency=4)
+        with self.assertRaises(ValueError):
+            xmlrunner.XMLTestRunner(async_concurrency=4, capture_fd=True)
+
+    def _async_test_class(self, barrier_parties):
+        barrier = threading.Barrier(barrier_parties, timeout=10)
+        running = set()
+        concurrency = {}
+
+        class DummyAsyncTest(unittest.IsolatedAsyncioTestCase):
+            setups = 0
+
+            @classmethod
+            def setUpClass(cls):
+                cls.setups += 1
+
+            async def test_barrier(self):
+                running.add(self.id())
+                print(self.id())
+                # blocks the loop of this test only, and times out unless
+                # barrier_parties tests run at once
+                barrier.wait()
+                await asyncio.sleep(0.01)
+                running.remove(self.id())
+
+            test_barrier_2 = test_barrier
+            test_barrier_3 = test_barrier
+
+            @not_thread_safe
+            async def test_alone(self):
+                concurrency[self.id()] = len(running) + 1
+
+        return DummyAsyncTest, concurrency
+
+    def test_async_concurrency(self):
+        # the first test runs alone, and sets up the class
+        DummyAsyncTest, concurrency = self._async_test_class(2)
+        suite = unittest.TestSuite([
+            DummyAsyncTest('test_alone'), DummyAsyncTest('test_barrier'),
+            DummyAsyncTest('test_barrier_2')])
+        result, output = self._run(
+            xmlrunner.XMLTestRunner, suite, async_concurrency=2)
+        self.assertEqual(result.testsRun, 3)
+        self.assertEqual(len(result.successes), 3)
+        self.assertEqual(DummyAsyncTest.setups, 1)
+        self.assertEqual(
+            concurrency[DummyAsyncTest('test_alone').id()], 1)
+        for test_info in result.successes:
+            if 'barrier' in test_info.test_id:
+                self.assertEqual(test_info.stdout, test_info.test_id + '\n')
+        self.assertEqual(output.count(b'<testcase '), 3)
+
+    def test_async_concurrency_other_tests(self):
+        # only the asyncio tests leave the usual TestSuite.run
+        runs = []
+
+        class RecordingSuite(unittest.TestSuite):
+            def run(self, result, debug=False):
+                runs.append(self.countTestCases())
+                return super(RecordingSuite, self).run(result, debug)
+        DummyAsyncTest, concurrency = self._async_test_class(2)
+        suite = unittest.TestSuite([
+            RecordingSuite(unittest.TestLoader().loadTestsFromTestCase(
+                self.DummySetUpClassTest)),
+            unittest.TestSuite([
+                DummyAsyncTest('test_alone'), DummyAsyncTest('test_barrier'),
+                DummyAsyncTest('test_barrier_2')])])
+        result, output = self._run(
+            xmlrunner.XMLTestRunner, suite, async_concurrency=2)
+        self.assertEqual(runs, [2])
+        self.assertEqual(result.testsRun, 5)
+        self.assertEqual(len(result.successes), 5)
+        self.assertEqual(DummyAsyncTest.setups, 1)
+        self.assertEqual(output.count(b'<testcase '), 5)
+        # the tests are released once run
+        self.assertEqual(list(suite), [None, None])
+
+    def test_async_concurrency_opt_out(self):
+        DummyAsyncTest, concurrency = self._async_test_class(1)
+        suite = unittest.TestLoader().loadTestsFromTestCase(DummyAsyncTest)
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, suite, workers=1,
+            executor='thread', async_concurrency=4)
+        self.assertEqual(len(result.successes), 4)
+        self.assertEqual(
+            concurrency[DummyAsyncTest('test_alone').id()], 1)
+
+    @mock.patch('xmlrunner.result.time', return_value=0)
+    def test_thread_same_report(self, _):
+        tests = (self.DummyTest, self.DummySetUpClassTest)
+        expected_result, expected = self._run(
+            xmlrunner.XMLTestRunner, self._suite(*tests))
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests), workers=1,
+            executor='thread')
+        self.assertEqual(re.sub(br' at 0x[0-9a-f]+', b'', output),
+                         re.sub(br' at 0x[0-9a-f]+', b'', expected))
+        self.assertEqual(result.testsRun, expected_result.testsRun)
+
+    def _thread_test_classes(self, name, count, concurrency, **attributes):
+        # records the most tests running along with each test
+        def test_output(test):
+            with lock:
+                running.add(test.id())
+            for i in range(20):
+                print(test.id(), i)
+                with lock:
+                    concurrency[test.id()] = max(
+                        concurrency.get(test.id(), 0), len(running))
+                time.sleep(0.001)
+            with lock:
+                running.remove(test.id())
+        lock = threading.Lock()
+        running = set()
+        return [type('%s%d' % (name, i), (unittest.TestCase,), dict(
+                    test_output=test_output, test_output_2=test_output,
+                    **attributes))
+                for i in range(count)]
+
+    def test_threads(self):
+        orig_stdout = sys.stdout
+        concurrency = {}
+        tests = self._thread_test_classes('DummyThreadTest', 4, concurrency)
+        with capture_stdout_stderr() as r:
+            result, output = self._run(
+                xmlrunner.XMLParallelTestRunner, self._suite(*tests),
+                workers=4, executor='thread')
+        self.assertIs(orig_stdout, sys.stdout)
+        self.assertFalse(r[0].getvalue())
+        self.assertEqual(result.testsRun, 8)
+        self.assertGreater(max(concurrency.values()), 1)
+        for test_info in result.successes:
+            self.assertEqual(
+                test_info.stdout,
+                ''.join('%s %d\n' % (test_info.test_id, i)
+                        for i in range(20)))
+        self.assertEqual(output.count(b'<testsuite '), 4)
+
+    def test_threads_not_thread_safe(self):
+        concurrency = {}
+        tests = self._thread_test_classes('DummyThreadTest', 2, concurrency)
+        tests += self._thread_test_classes(
+            'DummyNotThreadSafeTest', 1, concurrency,
+            xmlrunner_thread_safe=False)
+        tests[0].test_output_2 = not_thread_safe(
+            lambda test: tests[0].test_output(test))
+        result, output = self._run(
+            xmlrunner.XMLParallelTestRunner, self._suite(*tests),
+            workers=3, executor='thread')
+        self.assertEqual(result.testsRun, 6)
+        self.assertEqual(len(result.successes), 6)
+        not_thread_safe_tests = [
+            tests[0]('test_output_2').id(), tests[2]('test_output').id(),
+            tests[2]('test_output_2').id()]
+        for test_id in not_thread_safe_tests:
+            self.assertEqual(concurrency[test_id], 1, test_id)
+
+
+class ShardingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.outdir = mkdtemp()
+        self.addCleanup(rmtree, self.outdir)
+        self.classes = [
+            type('DummyShardTest%d' % count, (unittest.TestCase,), dict(
+                ('test_%d' % i, lambda test: None) for i in range(count)))
+            for count in (1, 2, 3, 4)]
+        self.suite = self._suite()
+
+    def _suite(self):
+        return unittest.TestSuite(
+            unittest.defaultTestLoader.loadTestsFromTestCase(testcase)
+            for testcase in self.classes)
+
+    def _shards(self, count, durations=None):
+        return [
+            [test.id() for test in _iter_tests(
+                shard_suite(self.suite, index, count, durations))]
+            for index in range(count)]
+
+    def _class_names(self, shard):
+        return set(test_id.rpartition('.')[0] for test_id in shard)
+
+    def test_shards_split_whole_classes(self):
+        shards = self._shards(2)
+        for shard in shards:
+            self.assertEqual(shard, sorted(shard, key=self._order))
+        all_ids = [test.id() for test in _iter_tests(self.suite)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(all_ids))
+        self.assertFalse(
+            self._class_names(shards[0]) & self._class_names(shards[1]))
+        # balanced on the number of tests without any duration
+        self.assertEqual([len(shard) for shard in shards], [5, 5])
+
+    def _order(self, test_id):
+        return [test.id() for test in _iter_tests(self.suite)].index(test_id)
+
+    def test_shards_balanced_on_durations(self):
+        durations = dict(
+            (name, 1.0) for name in self._class_names(self._shards(1)[0]))
+        slow = self.classes[0]('test_0').id().rpartition('.')[0]
+        durations[slow] = 9.0
+        shards = self._shards(2, durations)
+        self.assertEqual([len(shard) for shard in shards], [1, 9])
+        self.assertEqual(self._class_names(shards[0]), {slow})
+
+    def test_shards_single_shard(self):
+        self.assertEqual(len(self._shards(1)[0]), 10)
+        self.assertEqual(self._shards(5)[4], [])
+
+    def _run_program_shards(self, *argv):
+        module = types.ModuleType('dummy_shards')
+        for name, count in (('A', 10), ('B', 10), ('C', 1), ('D', 1)):
+            namespace = dict(
+                ('test_%d' % i, lambda test: None) for i in range(count))
+            namespace['__module__'] = module.__name__
+            setattr(module, name,
+                    type(name, (unittest.TestCase,), namespace))
+        shards = []
+        for index in range(2):
+            runner = mock.Mock()
+            xmlrunner.runner.XMLTestProgram(
+                module=module, testRunner=runner, exit=False,
+                argv=['xmlrunner', '-o', os.path.join(self.outdir, str(index)),
+                      '--shard-index', str(index), '--shard-count', '2'] +
+                list(argv))
+            suite, = runner.return_value.run.call_args[0]
+            shards.append(set(test.id() for test in _iter_tests(suite)))
+        self.assertFalse(shards[0] & shards[1])
+        self.assertEqual(len(shards[0] | shards[1]), 22)
+        return shards
+
+    def test_program_shards_ignore_output_reports(self):
+        # the earlier reports of each node are those of its own shard
+        os.makedirs(os.path.join(self.outdir, '0'))
+        os.makedirs(os.path.join(self.outdir, '1'))
+        times = [('dummy_shards.A', '50'), ('dummy_shards.C', '0.1'),
+                 ('dummy_shards.B', '100'), ('dummy_shards.D', '0.1')]
+        self._write_report(os.path.join('0', 'TEST-a.xml'), times[:2])
+        self._write_report(os.path.join('1', 'TEST-b.xml'), times[2:])
+        shards = self._run_program_shards()
+        self.assertEqual([len(shard) for shard in shards], [11, 11])
+        # balanced on the reports of both nodes when given
+        self._write_report('TEST-a.xml', times)
+        shards = self._run_program_shards('--shard-history', self.outdir)
+        self.assertEqual([len(shard) for shard in shards], [10, 12])
+
+    def test_invalid_shard(self):
+        with self.assertRaises(ValueError):
+            shard_suite(self.suite, 2, 2)
+        with self.assertRaises(ValueError):
+            shard_suite(self.suite, -1, 2)
+        with self.assertRaises(ValueError):
+            shard_suite(self.suite, 0, 0)
+
+    def _write_report(self, name, testcases, compression=None):
+        data = '<testsuite>%s</testsuite>' % ''.join(
+            '<testcase classname="%s" name="test" time="%s"/>' % testcase
+            for testcase in testcases)
+        with open(os.path.join(self.outdir, name), 'wb') as report_file:
+            report_file.write(compress(data.encode('utf8'), compression))
+
+    def test_read_durations(self):
+        self._write_report('TEST-a.xml', [('X', '1.0'), ('X', '2.0'),
+                                          ('Y', '0.5'), ('Y', 'nan?')])
+        self._write_report('TEST-b.xml.gz', [('X', '5.0')], 'gzip')
+        self._write_report('TEST-c.xml', [])
+        with open(os.path.join(self.outdir, 'TEST-d.xml'), 'w') as report:
+            report.write('<testsuite>')
+        self._write_report('other.xml', [('Z', '1.0')])
+        self.assertEqual(read_durations(self.outdir), {'X': 4.0, 'Y': 0.5})
+        self.assertEqual(
+            read_durations(os.path.join(self.outdir, 'TEST-b.xml.gz')),
+            {'X': 5.0})
+        self.assertEqual(
+            read_durations(os.path.join(self.outdir, 'missing')), {})
+
+    def test_read_durations_of_reports(self):
+        runner = xmlrunner.XMLTestRunner(
+            output=self.outdir, outsuffix='', stream=StringIO())
+        # the tests of a suite are released as they run
+        runner.run(self._suite())
+        durations = read_durations(self.outdir)
+        self.assertEqual(
+            sorted(durations), sorted(self._class_names(self._shards(1)[0])))
+        shards = self._shards(3, durations)
+        self.assertEqual(len(sum(shards, [])), 10)
 
 
 class DuplicateWriterTestCase(unittest.TestCase):
@@ -1016,6 +2276,279 @@ class XMLProgramTestCase(unittest.TestCase):
         testrunner.assert_called_once_with(**kwargs)
         exiter.assert_called_once_with(False)
 
+    @mock.patch('sys.argv', ['xmlrunner', '--report-workers', '4'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_report_workers(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            report_workers=4,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+
+    @mock.patch('sys.argv', ['xmlrunner', '--compact'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_compact(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            pretty=False,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+
+    @mock.patch('sys.argv', ['xmlrunner', '--compress', 'gzip'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_compress(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            compress='gzip',
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.argv', ['xmlrunner', '--deduplicate', 'reference'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_deduplicate(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            deduplicate='reference',
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.argv', ['xmlrunner', '--tb-max-frames', '5',
+                             '--tb-max-local-repr', '80',
+                             '--tb-max-size', '10000'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_tb_limits(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            tb_max_frames=5,
+            tb_max_local_repr=80,
+            tb_max_size=10000,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+
+    @mock.patch('sys.argv', ['xmlrunner', '--capture-fd'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_capture_fd(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            capture_fd=True,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+
+    @mock.patch('sys.argv', ['xmlrunner', '--workers', '4',
+                             '--executor', 'thread',
+                             '--async-concurrency', '8'])
+    @mock.patch('xmlrunner.parallel.XMLParallelTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_workers(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            workers=4,
+            executor='thread',
+            async_concurrency=8,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.argv', ['xmlrunner', '--workers', '1'])
+    @mock.patch('sys.exit')
+    def test_xmlrunner_single_worker(self, exiter):
+        testrunner = mock.Mock()
+        xmlrunner.runner.XMLTestProgram(testRunner=testrunner)
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.stderr', new_callable=StringIO)
+    def test_xmlrunner_workers_custom_runner(self, stderr):
+        class CustomRunner(xmlrunner.XMLTestRunner):
+            pass
+
+        for testrunner in (mock.Mock(), CustomRunner):
+            with mock.patch('sys.argv', ['xmlrunner', '--workers', '2']):
+                with self.assertRaises(SystemExit):
+                    xmlrunner.runner.XMLTestProgram(testRunner=testrunner)
+        with mock.patch('sys.argv', ['xmlrunner', '--workers', '0']):
+            with self.assertRaises(SystemExit):
+                xmlrunner.runner.XMLTestProgram()
+        self.assertEqual(2, stderr.getvalue().count(
+            '--workers requires XMLTestRunner or an XMLParallelTestRunner'))
+        self.assertIn('--workers must be at least 1', stderr.getvalue())
+
+    @mock.patch('sys.argv', ['xmlrunner', '--shard-index', '1',
+                             '--shard-count', '2', '--outsuffix', 'run'])
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_shards(self, exiter, testrunner):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            outsuffix='run-shard1of2',
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.argv', ['xmlrunner', '--shard-index', '0',
+                             '--shard-count', '2'])
+    @mock.patch('xmlrunner.runner._timestamp_suffix',
+                return_value='20261018120000')
+    @mock.patch('xmlrunner.runner.XMLTestRunner')
+    @mock.patch('sys.exit')
+    def test_xmlrunner_shards_timestamp(self, exiter, testrunner, _):
+        xmlrunner.runner.XMLTestProgram()
+
+        kwargs = dict(
+            buffer=mock.ANY,
+            failfast=mock.ANY,
+            verbosity=mock.ANY,
+            warnings=mock.ANY,
+            tb_locals=mock.ANY,
+            outsuffix='20261018120000-shard0of2',
+        )
+
+        testrunner.assert_called_once_with(**kwargs)
+        exiter.assert_called_once_with(False)
+
+    @mock.patch('sys.stderr', new_callable=StringIO)
+    def test_xmlrunner_invalid_shards(self, stderr):
+        for argv in (['--shard-index', '0'], ['--shard-count', '2'],
+                     ['--shard-index', '2', '--shard-count', '2']):
+            with mock.patch('sys.argv', ['xmlrunner'] + argv):
+                with self.assertRaises(SystemExit):
+                    xmlrunner.runner.XMLTestProgram()
+        self.assertIn('shard index must be between 0 and 1',
+                      stderr.getvalue())
+
+
+class TracebackFormatterTestCase(unittest.TestCase):
+    def _raise(self, depth):
+        nested_local = 'y' * 1000
+        if depth:
+            self._raise(depth - 1)
+        raise ValueError('innermost')
+
+    def _format(self, formatter, capture_locals=False):
+        try:
+            try:
+                self._raise(10)
+            except ValueError:
+                raise KeyError('outer')
+        except KeyError as e:
+            return formatter.format(
+                type(e), e, e.__traceback__, capture_locals)
+
+    def test_no_limits(self):
+        try:
+            self._raise(3)
+        except ValueError as e:
+            expected = ''.join(traceback.TracebackException(
+                type(e), e, e.__traceback__, compact=True).format())
+            self.assertEqual(
+                _TracebackFormatter().format(type(e), e, e.__traceback__),
+                expected)
+
+    def test_max_frames(self):
+        text = self._format(_TracebackFormatter(max_frames=2))
+        # 2 frames of the innermost exception, 1 of the outer one
+        self.assertEqual(text.count('  File '), 3)
+        self.assertIn('depth - 1)\n  File ', text)
+        self.assertIn('ValueError: innermost', text)
+        self.assertIn("raise ValueError('innermost')", text)
+        self.assertIn('KeyError: ', text)
+
+    def test_max_local_repr(self):
+        text = self._format(
+            _TracebackFormatter(max_local_repr=10), capture_locals=True)
+        self.assertIn("nested_local = 'yy...yyy'\n", text)
+        self.assertIn('depth = 0\n', text)
+        self.assertNotIn('yyyy', text)
+
+    def test_max_size(self):
+        full = self._format(_TracebackFormatter())
+        text = self._format(_TracebackFormatter(max_size=200))
+        self.assertTrue(text.startswith(full[:100]))
+        self.assertTrue(text.endswith(full[-100:]))
+        self.assertIn('\n[... %d characters dropped ...]\n' % (
+            len(full) - 200), text)
+
 
 class ResolveFilenameTestCase(unittest.TestCase):
     @mock.patch('os.path.relpath')
@@ -1035,3 +2568,56 @@ class ResolveFilenameTestCase(unittest.TestCase):
         relpath.side_effect = ValueError("ValueError: path is on mount 'C:', start on mount 'D:'")
         filename = resolve_filename('C:\\path\\to\\somefile.py')
         self.assertEqual(filename, 'C:\\path\\to\\somefile.py')
+
+
+class ReportNamesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.names = _ReportNames()
+
+    def test_class_name(self):
+        for test_id, class_name in [
+                ('module.Class.test', 'module.Class'),
+                ('__main__.Class.test', 'Class'),
+                ('__main__.test', ''),
+                ('module.Class.test (i=1.5)', 'module.Class'),
+                ('__main__.Class.test (i=1)', 'Class'),
+                ('test', ''),
+        ]:
+            self.assertEqual(self.names.class_name(test_id), class_name)
+            # cached
+            self.assertEqual(self.names.class_name(test_id), class_name)
+
+    @mock.patch('os.path.relpath')
+    def test_filename_resolved_once(self, relpath):
+        relpath.return_value = 'somefile.py'
+        for _ in range(3):
+            filename = self.names.filename('/path/to/somefile.py')
+            self.assertEqual(filename, 'somefile.py')
+        self.assertEqual(relpath.call_count, 1)
+        self.names.clear()
+        self.names.filename('/path/to/somefile.py')
+        self.assertEqual(relpath.call_count, 2)
+
+    def test_per_result(self):
+        self.assertIsNot(_XMLTestResult()._report_names,
+                         _XMLTestResult()._report_names)
+
+    def test_filename_resolved_from_start(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        names = _ReportNames()
+        os.chdir(cwd)
+        self.assertEqual(names.filename(os.path.abspath(__file__)),
+                         os.path.basename(__file__))
+
+    def test_pickled_empty(self):
+        self.names.testcase_name(XMLTestRunnerTestCase.DummyTest('test_pass'))
+        names = pickle.loads(pickle.dumps(self.names))
+        self.assertEqual({}, names._testcase_names)
+        self.assertEqual(self.names._start, names._start)
+
+    def test_testcase_name(self):
+        test = XMLTestRunnerTestCase.DummyTest('test_pass')
+        self.assertEqual(self.names.testcase_name(test),
+                         xmlrunner.result.testcase_name(test))
@@ -12,5 +12,6 @@ except ImportError:
     __version__ = "unknown"
 
 from .runner import XMLTestRunner
+from .parallel import XMLParallelTestRunner
 
-__all__ = ('__version__', 'XMLTestRunner')
+__all__ = ('__version__', 'XMLTestRunner', 'XMLParallelTestRunner')
@@ -1,5 +1,4 @@
 import re
-import sys
 import datetime
 import time
 
@@ -13,25 +12,79 @@ __all__ = ('TestXMLBuilder', 'TestXMLContext')
 # http://www.iana.org/assignments/character-sets/character-sets.xhtml
 UTF8 = 'UTF-8'
 
-# Workaround for Python bug #5166
-# http://bugs.python.org/issue5166
+# Characters allowed in XML 1.0 documents, as (first, last) code points:
+# https://www.w3.org/TR/xml/#charsets
+_xml_chars = [
+    (0x09, 0x0A), (0x0D, 0x0D), (0x20, 0xD7FF), (0xE000, 0xFFFD),
+    (0x10000, 0x10FFFF),
+]
+
+# Same, without the control characters and non-characters that are
+# discouraged: https://www.w3.org/TR/xml/#charsets
+_xml_safe_chars = [
+    (0x09, 0x0A), (0x0D, 0x0D), (0x20, 0x7E), (0x85, 0x85), (0xA0, 0xD7FF),
+    (0xE000, 0xFDCF), (0xFDE0, 0xFFFD),
+] + [
+    (plane, plane + 0xFFFD) for plane in range(0x10000, 0x110000, 0x10000)
+]
+
+
+def _sanitizer(allowed, default_replacement):
+    """Returns a function removing or replacing the characters of a text
+    that are not in `allowed`, a list of (first, last) code points.
+
+    Texts are mostly ASCII: those are scanned with `str.isprintable` and,
+    when they are long, `bytes.translate`, which are much faster than a
+    regular expression.
+    Other texts are scanned with a regular expression matching any character
+    outside of the allowed set. Texts without any character to remove are
+    returned as is.
+    """
+    sub = re.compile(u'[^%s]' % u''.join(
+        u'%s-%s' % (chr(first), chr(last)) for first, last in allowed
+    )).sub
+    ascii_invalid = bytes(
+        code for code in range(0x80)
+        if not any(first <= code <= last for first, last in allowed)
+    )
 
-_char_tail = ''
+    def sanitize(text, replacement=default_replacement):
+        if text.isascii():
+            if text.isprintable():
+                return text
+            if len(text) < 256:
+                # not worth the copies made below
+                return sub(replacement, text)
+            data = text.encode('ascii')
+            valid = data.translate(None, ascii_invalid)
+            if len(valid) == len(data):
+                return text
+            if not replacement:
+                return valid.decode('ascii')
+        return sub(replacement, text)
 
-if sys.maxunicode > 0x10000:
-    _char_tail = (u'%s-%s') % (
-        chr(0x10000),
-        chr(min(sys.maxunicode, 0x10FFFF))
-    )
+    return sanitize
 
-_nontext_sub = re.compile(
-    r'[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD%s]' % _char_tail,
-    re.U
-).sub
 
+# Replaces the characters that are not allowed in XML 1.0 documents.
+replace_nontext = _sanitizer(_xml_chars, u'\uFFFD')
 
-def replace_nontext(text, replacement=u'\uFFFD'):
-    return _nontext_sub(replacement, text)
+# Removes the characters that are not allowed, or discouraged, in XML 1.0
+# documents.
+remove_unsafe = _sanitizer(_xml_safe_chars, u'')
+
+
+def cdata_sections(text):
+    """Yields the parts of `text` to write in separate CDATA sections, so that
+    none of them contains ']]>': the text is split between ']]' and '>'.
+    """
+    start = 0
+    pos = text.find(']]>')
+    while pos >= 0:
+        yield text[start:pos + 2]
+        start = pos + 2
+        pos = text.find(']]>', start)
+    yield text[start:]
 
 
 class TestXMLContext(object):
@@ -176,14 +229,8 @@ class TestXMLBuilder(object):
         """
         element = self._xml_doc.createElement(tag)
 
-        pos = content.find(']]>')
-        while pos >= 0:
-            tmp = content[0:pos+2]
-            element.appendChild(self._create_cdata_section(tmp))
-            content = content[pos+2:]
-            pos = content.find(']]>')
-
-        element.appendChild(self._create_cdata_section(content))
+        for section in cdata_sections(replace_nontext(content)):
+            element.appendChild(self._xml_doc.createCDATASection(section))
 
         self._append_child(element)
         return element
@@ -238,10 +285,12 @@ class TestXMLBuilder(object):
 
         return True
 
-    def finish(self):
+    def finish(self, pretty=True):
         """Ends all open contexts and returns a pretty printed version of the
-        generated XML document.
+        generated XML document, or a compact one if `pretty` is False.
         """
         while self.end_context():
             pass
+        if not pretty:
+            return self._xml_doc.toxml(encoding=UTF8)
         return self._xml_doc.toprettyxml(indent='\t', encoding=UTF8)
@@ -0,0 +1,116 @@
+"""
+Compression of the XML reports.
+
+Reports are compressed while they are written: `open_compressed` wraps the
+binary stream a report is written to, so that the report is never held in
+memory in both its plain and its compressed form.
+"""
+
+import bz2
+import gzip
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+
+__all__ = ('GZIP', 'XZ', 'BZ2', 'COMPRESSIONS', 'check_compression',
+           'filename_suffix', 'open_compressed', 'detect_compression',
+           'compress', 'decompress')
+
+
+GZIP = 'gzip'
+XZ = 'xz'
+BZ2 = 'bz2'
+
+COMPRESSIONS = (GZIP, XZ, BZ2)
+
+_SUFFIXES = {
+    GZIP: '.gz',
+    XZ: '.xz',
+    BZ2: '.bz2',
+}
+
+_MAGIC_NUMBERS = {
+    GZIP: b'\x1f\x8b',
+    XZ: b'\xfd7zXZ\x00',
+    BZ2: b'BZh',
+}
+
+
+def check_compression(compression):
+    """
+    Raises ValueError if `compression` is neither empty nor one of
+    `COMPRESSIONS` available in this Python.
+    """
+    if not compression:
+        return
+    if compression not in COMPRESSIONS:
+        raise ValueError('unknown report compression: %r' % (compression,))
+    if compression == XZ and lzma is None:
+        raise ValueError('xz report compression requires the lzma module')
+
+
+def filename_suffix(compression):
+    """
+    Returns the suffix appended to the name of the report files.
+    """
+    if not compression:
+        return ''
+    return _SUFFIXES[compression]
+
+
+def open_compressed(fileobj, compression):
+    """
+    Returns a binary file object compressing what is written to it into
+    `fileobj`. Closing it flushes the compressor but leaves `fileobj` open.
+    """
+    check_compression(compression)
+    if compression == GZIP:
+        return gzip.GzipFile(fileobj=fileobj, mode='wb')
+    if compression == XZ:
+        return lzma.LZMAFile(fileobj, 'wb')
+    return bz2.BZ2File(fileobj, 'wb')
+
+
+def detect_compression(data):
+    """
+    Returns the compression of `data` guessed from its magic number, or ''
+    if it is not compressed.
+    """
+    for compression in COMPRESSIONS:
+        if data.startswith(_MAGIC_NUMBERS[compression]):
+            return compression
+    return ''
+
+
+def compress(data, compression):
+    """
+    Returns `data` compressed with `compression`, or unchanged if
+    `compression` is empty.
+    """
+    check_compression(compression)
+    if compression == GZIP:
+        return gzip.compress(data)
+    if compression == XZ:
+        return lzma.compress(data)
+    if compression == BZ2:
+        return bz2.compress(data)
+    return data
+
+
+def decompress(data):
+    """
+    Returns `data` decompressed, if it is compressed with one of
+    `COMPRESSIONS`.
+    """
+    compression = detect_compression(data)
+    check_compression(compression)
+    if compression == GZIP:
+        return gzip.decompress(data)
+    if compression == XZ:
+        return lzma.decompress(data)
+    if compression == BZ2:
+        return bz2.decompress(data)
+    return data
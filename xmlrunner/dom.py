@@ -0,0 +1,194 @@
+"""
+Document implementations used to build the XML reports.
+
+The report code in `xmlrunner.result` only relies on a small subset of the
+`xml.dom.minidom` API. `LxmlDocument` provides that subset on top of
+`lxml.etree`, which creates and serializes elements in C; `MinidomDocument`
+is the pure-Python fallback used when lxml 4.5 or later is not installed.
+"""
+
+from io import StringIO
+from xml.dom import minidom
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover
+    etree = None
+
+if etree is not None and not hasattr(etree, 'indent'):
+    # lxml < 4.5 cannot indent the reports
+    etree = None
+
+from .builder import cdata_sections, replace_nontext
+
+
+__all__ = ('MINIDOM', 'LXML', 'MinidomDocument', 'LxmlDocument',
+           'document_class')
+
+
+MINIDOM = 'minidom'
+LXML = 'lxml'
+
+
+class MinidomDocument(minidom.Document):
+    """
+    `xml.dom.minidom` document.
+    """
+
+    def createCDATASections(self, data):
+        """
+        Returns the CDATA sections to append to an element to hold `data`.
+        """
+        return [self.createCDATASection(section)
+                for section in cdata_sections(data)]
+
+    def serialize_children(self, element, level, encoding,
+                           indent='\t', newl='\n'):
+        """
+        Returns the children of `element` serialized the same way as they
+        would be by `toprettyxml` when `element` is at depth `level - 1`.
+        """
+        writer = StringIO()
+        for node in element.childNodes:
+            node.writexml(writer, indent * level, indent, newl)
+        return writer.getvalue().encode(encoding, 'xmlcharrefreplace')
+
+
+class _CDATASection(object):
+    """
+    CDATA section waiting to be appended to an element.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+
+# lxml elements are only created when lxml is installed
+_ElementBase = object if etree is None else etree.ElementBase
+
+
+class _LxmlElement(_ElementBase):
+    """
+    lxml element with the `xml.dom.minidom` methods used by the reports.
+    """
+
+    @property
+    def tagName(self):
+        return self.tag
+
+    def setAttribute(self, name, value):
+        try:
+            self.set(name, value)
+        except ValueError:
+            # lxml refuses characters that are not allowed in XML
+            self.set(name, replace_nontext(value))
+
+    def getAttribute(self, name):
+        return self.get(name, '')
+
+    def appendChild(self, node):
+        if isinstance(node, _CDATASection):
+            # lxml keeps a single text node per element: adjacent
+            # sections are merged, and escaped when CDATA can't hold them
+            text = (self.text or '') + node.data
+            try:
+                if ']]>' in text:
+                    self.text = text
+                else:
+                    self.text = etree.CDATA(text)
+            except ValueError:
+                self.text = etree.CDATA(replace_nontext(text))
+        else:
+            self.append(node)
+        return node
+
+
+if etree is not None:
+    _lookup = etree.ElementDefaultClassLookup(element=_LxmlElement)
+    _parser = etree.XMLParser()
+    _parser.set_element_class_lookup(_lookup)
+
+
+class LxmlDocument(object):
+    """
+    `lxml.etree` document with the `xml.dom.minidom` methods used by the
+    reports.
+    """
+
+    def __init__(self):
+        self.documentElement = None
+
+    def createElement(self, tag):
+        return _parser.makeelement(tag)
+
+    def createTextNode(self, data):
+        return _CDATASection(data)
+
+    def createCDATASection(self, data):
+        return _CDATASection(data)
+
+    def createCDATASections(self, data):
+        # lxml merges adjacent sections: a single one is appended
+        return [_CDATASection(data)]
+
+    def createComment(self, data):
+        # lxml checks what toprettyxml would only check when writing
+        if data.endswith('-'):
+            data += ' '
+        try:
+            return etree.Comment(data)
+        except ValueError:
+            return etree.Comment(replace_nontext(data))
+
+    def appendChild(self, node):
+        self.documentElement = node
+        return node
+
+    def _tostring(self, element, encoding, indent, level=0):
+        if indent:
+            etree.indent(element, space=indent, level=level)
+        return etree.tostring(element, encoding=encoding,
+                              xml_declaration=False, with_tail=False)
+
+    def toprettyxml(self, indent='\t', newl='\n', encoding='UTF-8'):
+        # minidom style declaration, lxml would use single quotes
+        xml_content = '<?xml version="1.0" encoding="%s"?>%s' % (
+            encoding, newl)
+        xml_content = xml_content.encode(encoding)
+        if self.documentElement is not None:
+            xml_content += self._tostring(
+                self.documentElement, encoding, indent)
+            xml_content += newl.encode(encoding)
+        return xml_content
+
+    def toxml(self, encoding='UTF-8'):
+        return self.toprettyxml('', '', encoding)
+
+    def serialize_children(self, element, level, encoding,
+                           indent='\t', newl='\n'):
+        """
+        Returns the children of `element` serialized the same way as they
+        would be by `toprettyxml` when `element` is at depth `level - 1`.
+        """
+        prefix = (indent * level).encode(encoding)
+        suffix = newl.encode(encoding)
+        return b''.join(
+            prefix + self._tostring(node, encoding, indent, level) + suffix
+            for node in element
+        )
+
+
+def document_class(backend=None):
+    """
+    Returns the document class of the given backend, `LXML` or `MINIDOM`.
+    By default lxml is used when it is installed.
+    """
+    if backend is None:
+        backend = MINIDOM if etree is None else LXML
+    if backend == LXML:
+        if etree is None:
+            raise ValueError('lxml report backend requires lxml>=4.5')
+        return LxmlDocument
+    if backend == MINIDOM:
+        return MinidomDocument
+    raise ValueError('unknown report backend: %r' % (backend,))
@@ -44,13 +44,19 @@ class XMLTestRunner(DiscoverRunner):
             file_path = os.path.join(output_dir, single_file)
             output = open(file_path, 'wb')
 
-        return dict(
+        kwargs = dict(
             verbosity=verbosity,
             descriptions=getattr(settings, 'TEST_OUTPUT_DESCRIPTIONS', False),
             failfast=self.failfast,
             resultclass=self.get_resultclass(),
             output=output,
         )
+        # only passed when set, custom test runners may not accept them
+        for name in ('tb_max_frames', 'tb_max_local_repr', 'tb_max_size'):
+            setting = 'TEST_OUTPUT_' + name.upper()
+            if hasattr(settings, setting):
+                kwargs[name] = getattr(settings, setting)
+        return kwargs
 
     def run_suite(self, suite, **kwargs):
         runner_kwargs = self.get_test_runner_kwargs()
@@ -1,6 +1,8 @@
 import io
 import lxml.etree as etree
 
+from xmlrunner.compression import compress, decompress, detect_compression
+
 
 TRANSFORM = etree.XSLT(etree.XML(b'''\
 <?xml version="1.0" encoding="UTF-8"?>
@@ -21,9 +23,16 @@ TRANSFORM = etree.XSLT(etree.XML(b'''\
 </xsl:stylesheet>'''))
 
 
-def transform(xml_data):
+def transform(xml_data, compression=None):
+    """
+    Transforms a report, compressed with gzip, xz or bz2 or not. The result
+    is compressed like `xml_data` when `compression` is None, not compressed
+    when it is empty, and compressed with `compression` otherwise.
+    """
+    if compression is None:
+        compression = detect_compression(xml_data)
     out = io.BytesIO()
-    xml_doc = etree.XML(xml_data)
+    xml_doc = etree.XML(decompress(xml_data))
     result = TRANSFORM(xml_doc)
     result.write(out)
-    return out.getvalue()
+    return compress(out.getvalue(), compression)
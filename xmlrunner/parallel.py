@@ -0,0 +1,560 @@
+"""
+Runs the tests of a suite in worker processes or threads, and reports them as
+`XMLTestRunner` does.
+"""
+
+import collections
+import contextlib
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+from time import time
+from unittest.suite import _ErrorHolder
+
+from .unittest import unittest
+from .runner import XMLTestRunner
+
+
+__all__ = ('XMLParallelTestRunner', 'not_thread_safe')
+
+
+# messages sent by the workers to the parent process
+(_READY, _TESTS, _EXIT) = range(3)
+
+EXECUTORS = ('process', 'thread')
+
+_ASYNC_TEST_CASE = getattr(unittest, 'IsolatedAsyncioTestCase', ())
+
+
+def not_thread_safe(test_item):
+    """
+    Marks a TestCase class or test method as not to be run while other tests
+    run in the threads of XMLParallelTestRunner(executor='thread').
+    """
+    test_item.xmlrunner_thread_safe = False
+    return test_item
+
+
+def _thread_safe(test):
+    method = getattr(test, getattr(test, '_testMethodName', ''), None)
+    return (getattr(type(test), 'xmlrunner_thread_safe', True) and
+            getattr(method, 'xmlrunner_thread_safe', True))
+
+
+def _iter_tests(suite):
+    """
+    Yields the tests of `suite`, and of its nested suites, in order.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for nested in _iter_tests(test):
+                yield nested
+        else:
+            yield test
+
+
+def _test_units(suite):
+    """
+    Splits the tests of `suite` in units of consecutive tests of the same
+    class, the work distributed to the workers.
+    """
+    units = []
+    unit_class = None
+    for test in _iter_tests(suite):
+        if not units or type(test) is not unit_class:
+            unit_class = type(test)
+            units.append([])
+        units[-1].append(test)
+    return units
+
+
+def _module_units(units):
+    """
+    Merges the consecutive units of the modules having setUpModule or
+    tearDownModule, which may not run concurrently in several threads.
+    """
+    merged = []
+    module = None
+    for unit in units:
+        unit_module = type(unit[0]).__module__
+        if merged and unit_module == module:
+            merged[-1].extend(unit)
+            continue
+        module = None
+        fixtures = sys.modules.get(unit_module)
+        if (hasattr(fixtures, 'setUpModule') or
+                hasattr(fixtures, 'tearDownModule')):
+            module = unit_module
+        merged.append(list(unit))
+    return merged
+
+
+def _worker_result(runner):
+    """
+    Returns the result a worker adds its tests to, before they are sent to
+    the result of the run.
+    """
+    result = runner.resultclass(
+        runner.stream, runner.descriptions, 0, runner.elapsed_times)
+    runner._setup_result(result)
+    # the units are parts of a single run: the class and module fixtures are
+    # only torn down when the next test needs others
+    result._testRunEntered = True
+    return result
+
+
+def _tear_down_fixtures(result):
+    """
+    Tears down the class and module fixtures left by the last test of a
+    worker.
+    """
+    suite = unittest.TestSuite()
+    suite._tearDownPreviousClass(None, result)
+    suite._handleModuleTearDown(result)
+
+
+def _run_worker(runner, units, connection, stop):
+    """
+    Runs the units sent by the parent process through `connection`, until
+    it sends None, and sends back the tests they add to the result.
+    """
+    result = _worker_result(runner)
+    tests_run = 0
+    while True:
+        connection.send((_READY,))
+        item = connection.recv()
+        if item is None:
+            break
+        unit, start = item
+        for index in range(start, len(units[unit])):
+            if result.shouldStop or stop.is_set():
+                break
+            unittest.TestSuite([units[unit][index]]).run(result)
+            connection.send((_TESTS, unit, index, result.testsRun - tests_run,
+                             result.pop_reported()))
+            tests_run = result.testsRun
+
+    _tear_down_fixtures(result)
+    connection.send((_TESTS, None, None, 0, result.pop_reported()))
+    connection.send((_EXIT,))
+    connection.close()
+
+
+class _Worker(object):
+    """
+    A worker process, and the next test of the unit it runs, as a
+    (unit, index) pair, or None between units.
+    """
+
+    __slots__ = ('process', 'position')
+
+    def __init__(self, process):
+        self.process = process
+        self.position = None
+
+
+class _ParallelRun(object):
+    """
+    Distributes the units of a run to the worker processes, and adds the
+    tests they send to `result`.
+    """
+
+    def __init__(self, runner, result, units):
+        self._runner = runner
+        self._result = result
+        self._units = units
+        self._pending = collections.deque(
+            (unit, 0) for unit in range(len(units)))
+        self._context = multiprocessing.get_context('fork')
+        self._stop = self._context.Event()
+        # worker of each connection
+        self._workers = {}
+
+    def run(self):
+        for _ in range(min(self._runner.workers, len(self._units))):
+            self._start_worker()
+        while self._workers:
+            for connection in wait(list(self._workers)):
+                self._receive(connection)
+
+    def _start_worker(self):
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_run_worker, daemon=True,
+            args=(self._runner, self._units, worker_connection, self._stop))
+        process.start()
+        worker_connection.close()
+        self._workers[connection] = _Worker(process)
+
+    def _receive(self, connection):
+        worker = self._workers[connection]
+        try:
+            message = connection.recv()
+        except EOFError:
+            # the worker exited without saying so
+            self._close(connection)
+            self._crashed(worker)
+            return
+
+        if message[0] == _READY:
+            connection.send(self._next_unit(worker))
+        elif message[0] == _TESTS:
+            _, unit, index, tests_run, reported = message
+            test = None
+            if unit is not None:
+                test = self._units[unit][index]
+                worker.position = (unit, index + 1)
+            self._result.testsRun += tests_run
+            for report_list, entry in reported:
+                self._result.add_reported(report_list, entry, test)
+            if self._result.shouldStop:
+                self._stop.set()
+        elif message[0] == _EXIT:
+            self._close(connection)
+
+    def _next_unit(self, worker):
+        worker.position = None
+        if self._result.shouldStop or not self._pending:
+            return None
+        worker.position = self._pending.popleft()
+        return worker.position
+
+    def _close(self, connection):
+        worker = self._workers.pop(connection)
+        connection.close()
+        worker.process.join()
+
+    def _crashed(self, worker):
+        """
+        Reports the exit of `worker` as an error of the test it was running,
+        and starts another worker for the rest of its unit and the following
+        units.
+        """
+        test = None
+        if worker.position is not None:
+            unit, index = worker.position
+            if index < len(self._units[unit]):
+                test = self._units[unit][index]
+                if index + 1 < len(self._units[unit]):
+                    self._pending.appendleft((unit, index + 1))
+
+        error = RuntimeError('worker process %d exited with code %s' % (
+            worker.process.pid, worker.process.exitcode))
+        result = self._result
+        if test is None:
+            test = _ErrorHolder('worker process %d' % worker.process.pid)
+            result.start_time = time()
+        else:
+            result.startTest(test)
+        result.addError(test, (RuntimeError, error, None))
+        result.stopTest(test)
+        if result.shouldStop:
+            self._stop.set()
+        elif self._pending:
+            self._start_worker()
+
+
+def _run_in_threads(runner, test, result, workers):
+    """
+    Runs the tests of `test` in `workers` threads, adding them to `result`.
+    """
+    units = _module_units(_test_units(test))
+    _ThreadedRun(runner, result, units, workers,
+                 runner.async_concurrency).run()
+
+
+class _AsyncTestSuite(unittest.TestSuite):
+    """
+    Consecutive tests of an IsolatedAsyncioTestCase class, run at once by
+    `_ThreadedRun._run_async_unit` when run by their parent suite.
+    """
+
+    def __init__(self, tests, threaded_run):
+        super(_AsyncTestSuite, self).__init__(tests)
+        self._threaded_run = threaded_run
+
+    def run(self, result, debug=False):
+        tests = list(self)
+        self._tests = []
+        self._threaded_run._run_async_unit(result, tests)
+        return result
+
+
+def _group_async_tests(suite, threaded_run):
+    """
+    Replaces, in `suite` and its nested suites, the consecutive tests of
+    each IsolatedAsyncioTestCase class by an `_AsyncTestSuite`. The other
+    tests and the suites themselves are left as they are.
+    """
+    if not isinstance(suite, unittest.TestSuite):
+        return
+    grouped = []
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            _group_async_tests(test, threaded_run)
+        elif isinstance(test, _ASYNC_TEST_CASE):
+            if (grouped and isinstance(grouped[-1], _AsyncTestSuite) and
+                    type(grouped[-1]._tests[0]) is type(test)):
+                grouped[-1].addTest(test)
+                continue
+            test = _AsyncTestSuite([test], threaded_run)
+        grouped.append(test)
+    suite._tests = grouped
+
+
+def _run_async_concurrently(runner, test, result):
+    """
+    Runs `test` with `result`, the tests of each IsolatedAsyncioTestCase
+    class up to `runner.async_concurrency` at once, and the other tests as
+    usual.
+    """
+    threaded_run = _ThreadedRun(runner, result, [], 1,
+                                runner.async_concurrency)
+    _group_async_tests(test, threaded_run)
+    try:
+        test(result)
+    finally:
+        threaded_run.close()
+
+
+class _SerialLock(object):
+    """
+    Lets any number of thread-safe tests run together, and the other tests
+    run alone. Tests waiting to run alone go before the thread-safe tests
+    coming after them.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._running = 0
+        self._alone = False
+        self._waiting = 0
+
+    @contextlib.contextmanager
+    def hold(self, thread_safe):
+        with self._condition:
+            if thread_safe:
+                while self._alone or self._waiting:
+                    self._condition.wait()
+                self._running += 1
+            else:
+                self._waiting += 1
+                while self._alone or self._running:
+                    self._condition.wait()
+                self._waiting -= 1
+                self._alone = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                if thread_safe:
+                    self._running -= 1
+                else:
+                    self._alone = False
+                self._condition.notify_all()
+
+
+class _ThreadedRun(object):
+    """
+    Runs the units of a run in `workers` threads, and adds their tests to
+    `result`. A single worker runs in the current thread.
+
+    Each thread adds its tests to a result of its own, which keeps the
+    timing of the current test and routes the output of the thread to its
+    captures, see `_XMLTestResult.route_output`. The tests are moved to
+    `result` under a lock after each test.
+
+    With `async_concurrency`, the tests of an IsolatedAsyncioTestCase class
+    are run by up to `async_concurrency` more threads at once, each test
+    with its own event loop, see `_run_async_unit`. XMLTestRunner only uses
+    it for those tests, see `_run_async_concurrently`: their first and not
+    thread-safe tests then run with `result` itself.
+    """
+
+    def __init__(self, runner, result, units, workers,
+                 async_concurrency=None):
+        self._runner = runner
+        self._result = result
+        self._units = units
+        self._workers = workers
+        self._pending = collections.deque(range(len(units)))
+        # guards the pending units and the result
+        self._lock = threading.Lock()
+        self._serial = _SerialLock()
+        self._errors = []
+        self._async_concurrency = async_concurrency
+        self._async_executor = None
+        self._async_results = threading.local()
+
+    def run(self):
+        try:
+            workers = min(self._workers, len(self._units))
+            if workers == 1:
+                self._work()
+            else:
+                threads = [
+                    threading.Thread(
+                        target=self._work, name='xmlrunner-worker-%d' % i)
+                    for i in range(workers)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            self.close()
+        if self._errors:
+            raise self._errors[0]
+
+    def close(self):
+        """
+        Stops the threads of the async executor.
+        """
+        if self._async_executor is not None:
+            self._async_executor.shutdown()
+            self._async_executor = None
+
+    def _next_unit(self):
+        with self._lock:
+            if self._result.shouldStop or not self._pending:
+                return None
+            return self._pending.popleft()
+
+    def _work(self):
+        try:
+            result = _worker_result(self._runner)
+            result.route_output()
+            thread_safe = True
+            while True:
+                unit = self._next_unit()
+                if unit is None:
+                    break
+                # units of modules with fixtures have several classes
+                for test_class, tests in itertools.groupby(
+                        self._units[unit], type):
+                    tests = list(tests)
+                    if (self._async_concurrency and
+                            issubclass(test_class, _ASYNC_TEST_CASE)):
+                        if not self._result.shouldStop:
+                            thread_safe = self._run_async_unit(result, tests)
+                        continue
+                    for test in tests:
+                        if self._result.shouldStop:
+                            break
+                        thread_safe = _thread_safe(test)
+                        self._run_test(result, test, thread_safe)
+            with self._serial.hold(thread_safe):
+                _tear_down_fixtures(result)
+            self._add(result, None)
+        except BaseException as error:
+            self._errors.append(error)
+
+    def _run_test(self, result, test, thread_safe):
+        with self._serial.hold(thread_safe):
+            unittest.TestSuite([test]).run(result)
+        if result is not self._result:
+            self._add(result, test)
+
+    def _run_async_unit(self, result, tests):
+        """
+        Runs the first test of `tests`, which sets up their class, then the
+        following thread-safe tests at once in the threads of the async
+        executor, and the others one after the other. The class is torn down
+        by `result` with the next test. Returns whether the last test run
+        with `result` was thread-safe.
+        """
+        thread_safe = _thread_safe(tests[0])
+        self._run_test(result, tests[0], thread_safe)
+        test_class = type(tests[0])
+        if (result._previousTestClass is test_class and
+                not getattr(test_class, '_classSetupFailed', False)):
+            if self._async_executor is None:
+                self._async_executor = ThreadPoolExecutor(
+                    self._async_concurrency,
+                    thread_name_prefix='xmlrunner-async')
+            futures = [
+                self._async_executor.submit(self._run_async_test, test)
+                for test in tests[1:] if _thread_safe(test)]
+            for future in futures:
+                future.result()
+        for test in tests[1:]:
+            if not _thread_safe(test) and not self._result.shouldStop:
+                thread_safe = False
+                self._run_test(result, test, thread_safe)
+        return thread_safe
+
+    def _run_async_test(self, test):
+        if self._result.shouldStop:
+            return
+        result = getattr(self._async_results, 'result', None)
+        if result is None:
+            result = _worker_result(self._runner)
+            result.route_output()
+            self._async_results.result = result
+        # the class and module are set up: they are neither set up nor torn
+        # down by this result
+        result._previousTestClass = type(test)
+        self._run_test(result, test, True)
+
+    def _add(self, result, test):
+        reported = result.pop_reported()
+        with self._lock:
+            self._result.testsRun += result.testsRun
+            result.testsRun = 0
+            for report_list, entry in reported:
+                self._result.add_reported(report_list, entry, test)
+
+
+class XMLParallelTestRunner(XMLTestRunner):
+    """
+    A test runner running the tests in `workers` processes, by default as
+    many as there are CPUs, and reporting them as XMLTestRunner does.
+
+    The tests are split in units of consecutive tests of the same TestCase
+    class, and each worker pulls the next unit when it is done with the
+    previous one: setUpClass runs once per unit, and setUpModule once per
+    worker as long as its units come from the same module. The outcome,
+    output and timing of each test are sent to this process as soon as the
+    test stops. A worker exiting in the middle of a test is reported as an
+    error of this test, and another worker takes over the rest of its unit.
+
+    The workers are forked from this process, so that the tests need not be
+    pickled; without the fork start method, the tests are run in this
+    process.
+
+    With `executor='thread'`, the workers are threads of this process,
+    which run in parallel on free-threaded Python builds. The output of each
+    thread is captured separately, but file descriptors cannot be captured.
+    Consecutive classes of a module with setUpModule or tearDownModule form
+    a single unit, and the tests marked with `not_thread_safe` run while no
+    other test runs.
+    """
+
+    def __init__(self, workers=None, executor='process', **kwargs):
+        super(XMLParallelTestRunner, self).__init__(**kwargs)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError('workers must be at least 1: %r' % (workers,))
+        self.workers = workers
+        if executor not in EXECUTORS:
+            raise ValueError('unknown executor: %r' % (executor,))
+        if executor == 'thread' and self.capture_fd:
+            raise ValueError(
+                'file descriptors cannot be captured by worker threads')
+        if executor == 'process' and self.async_concurrency:
+            raise ValueError(
+                "async_concurrency requires executor='thread'")
+        self.executor = executor
+
+    def _run_tests(self, test, result):
+        if self.executor == 'thread':
+            _run_in_threads(self, test, result, self.workers)
+            return
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            test(result)
+            return
+        _ParallelRun(self, result, _test_units(test)).run()
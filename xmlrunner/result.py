@@ -1,18 +1,32 @@
 
+import codecs
+import collections
+import contextlib
+import contextvars
 import inspect
 import io
 import os
 import sys
 import datetime
+import functools
+import hashlib
+import tempfile
 import traceback
 import re
+import reprlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from os import path
 from io import StringIO
+from queue import Queue
 
 # use direct import to bypass freezegun
 from time import time
 
 from .unittest import TestResult, TextTestResult, failfast
+from .dom import document_class
+from .compression import filename_suffix, open_compressed
+from .builder import remove_unsafe
 
 
 # Matches invalid XML1.0 unicode characters, like control characters:
@@ -41,12 +55,26 @@ _illegal_ranges = [
     for (low, high) in _illegal_unichrs
 ]
 
+# kept for backward compatibility, safe_unicode uses builder.remove_unsafe
 INVALID_XML_1_0_UNICODE_RE = re.compile(u'[%s]' % u''.join(_illegal_ranges))
 
 
 STDOUT_LINE = '\nStdout:\n%s'
 STDERR_LINE = '\nStderr:\n%s'
 
+# Deduplication modes of the tracebacks and outputs of tests, see
+# _XMLTestResult.deduplicate_payloads
+DEDUPLICATE_MEMORY = 'memory'
+DEDUPLICATE_REFERENCE = 'reference'
+DEDUPLICATIONS = (DEDUPLICATE_MEMORY, DEDUPLICATE_REFERENCE)
+
+# _TestInfo attributes holding payloads, and how references name them
+_PAYLOAD_KINDS = (
+    ('test_exception_info', 'traceback'),
+    ('stdout', 'stdout'),
+    ('stderr', 'stderr'),
+)
+
 
 def safe_unicode(data, encoding='utf8'):
     """Return a unicode string containing only valid XML characters.
@@ -54,8 +82,7 @@ def safe_unicode(data, encoding='utf8'):
     encoding - if data is a byte string it is first decoded to unicode
         using this encoding.
     """
-    data = str(data)
-    return INVALID_XML_1_0_UNICODE_RE.sub('', data)
+    return remove_unsafe(str(data))
 
 
 def testcase_name(test_method):
@@ -69,16 +96,107 @@ def testcase_name(test_method):
     return result
 
 
-def resolve_filename(filename):
-    # Try to make filename relative to current directory.
+def resolve_filename(filename, start=None):
+    # Try to make filename relative to `start`, by default the current
+    # directory.
     try:
-        rel_filename = os.path.relpath(filename)
+        rel_filename = os.path.relpath(filename, start)
     except ValueError:
         return filename
     # if not inside folder, keep as-is
     return filename if rel_filename.startswith('../') else rel_filename
 
 
+class _Payload(object):
+    """
+    A traceback or output shared by tests of a run: the first test that had
+    it and the number of tests that had it.
+    """
+
+    __slots__ = ('text', 'kind', 'test_id', 'count', '_reference')
+
+    def __init__(self, text, kind, test_id):
+        self.text = text
+        self.kind = kind
+        self.test_id = test_id
+        self.count = 1
+        self._reference = None
+
+    def reference(self):
+        """
+        Returns a short text referring to the first test with this payload.
+        """
+        if self._reference is None:
+            digest = hashlib.sha1(
+                self.text.encode('utf-8', 'surrogatepass')).hexdigest()
+            self._reference = '[same %s as %s, sha1 %s]' % (
+                self.kind, self.test_id, digest)
+        return self._reference
+
+
+class _ReportNames(object):
+    """
+    Caches, for a test run, the names derived from the test classes, test
+    ids and source files of its tests, which are shared by many tests. Each
+    `_XMLTestResult` has its own.
+
+    Filenames are resolved relative to `start`, by default the working
+    directory when the cache is created or cleared, whenever they are looked
+    up.
+    """
+
+    def __init__(self, start=None):
+        self.clear(start)
+
+    def __reduce__(self):
+        # sent to other processes as an empty cache, the test classes it is
+        # keyed by may not be picklable
+        return (_ReportNames, (self._start,))
+
+    def clear(self, start=None):
+        self._testcase_names = {}
+        self._class_names = {}
+        self._filenames = {}
+        self._start = os.getcwd() if start is None else start
+
+    def testcase_name(self, test_method):
+        """
+        Returns `testcase_name(test_method)`, computed once per test class.
+        """
+        testcase = type(test_method)
+        try:
+            return self._testcase_names[testcase]
+        except KeyError:
+            name = sys.intern(testcase_name(test_method))
+            self._testcase_names[testcase] = name
+            return name
+
+    def class_name(self, test_id):
+        """
+        Returns the class name of the test with id `test_id`, without its
+        '__main__.' prefix, computed once per class.
+        """
+        # subtest ids are followed by their parameters
+        prefix = test_id.split(' ', 1)[0].rpartition('.')[0]
+        try:
+            return self._class_names[prefix]
+        except KeyError:
+            name = re.sub(r'^__main__.', '', prefix + '.').rpartition('.')[0]
+            self._class_names[prefix] = name
+            return name
+
+    def filename(self, filename):
+        """
+        Returns `resolve_filename(filename)`, computed once per file.
+        """
+        try:
+            return self._filenames[filename]
+        except KeyError:
+            resolved = resolve_filename(filename, self._start)
+            self._filenames[filename] = resolved
+            return resolved
+
+
 class _DuplicateWriter(io.TextIOBase):
     """
     Duplicate output from the first handle to the second handle
@@ -90,6 +208,8 @@ class _DuplicateWriter(io.TextIOBase):
         super(_DuplicateWriter, self).__init__()
         self._first = first
         self._second = second
+        # text streams tell how much they wrote
+        self._first_is_text = isinstance(first, io.TextIOBase)
 
     def flush(self):
         try:
@@ -105,19 +225,20 @@ class _DuplicateWriter(io.TextIOBase):
         return True
 
     def getvalue(self):
-        return self._second.getvalue()
+        # unittest expects a string, even from a spilled output capture
+        return str(self._second.getvalue())
 
     def writelines(self, lines):
         self._first.writelines(lines)
         self._second.writelines(lines)
 
     def write(self, b):
-        if isinstance(self._first, io.TextIOBase):
+        if self._first_is_text:
             wrote = self._first.write(b)
 
             if wrote is not None:
                 # expected to always succeed to write
-                self._second.write(b[:wrote])
+                self._second.write(b if wrote == len(b) else b[:wrote])
 
             return wrote
         else:
@@ -127,12 +248,769 @@ class _DuplicateWriter(io.TextIOBase):
             return len(b)
 
 
+class _CaptureRouter(io.TextIOBase):
+    """
+    Replaces sys.stdout or sys.stderr while tests run concurrently, and sends
+    each write to the target bound to the execution context writing it, see
+    `bind`: each thread has its own context, and asyncio tasks get a copy of
+    the context they are created in. Contexts copied before the binding,
+    such as the one IsolatedAsyncioTestCase runs its coroutines in, fall
+    back on the target bound to the current thread. Writes from any other
+    thread, such as threads not started by a test, go to the replaced
+    `stream`.
+
+    Writes only read a context variable and a dict, they do not take any
+    lock.
+    """
+
+    def __init__(self, stream, name):
+        super(_CaptureRouter, self).__init__()
+        self.stream = stream
+        self._target = contextvars.ContextVar(
+            'xmlrunner_' + name, default=None)
+        # target of each thread, by thread identifier
+        self._threads = {}
+
+    def bind(self, target):
+        """
+        Sends the writes of the current context and thread to `target` until
+        `unbind` is called with the returned token.
+        """
+        thread = threading.get_ident()
+        previous = self._threads.get(thread)
+        self._threads[thread] = target
+        return (self._target.set(target), thread, previous)
+
+    def unbind(self, token):
+        token, thread, previous = token
+        self._target.reset(token)
+        if previous is None:
+            del self._threads[thread]
+        else:
+            self._threads[thread] = previous
+
+    def _current(self):
+        target = self._target.get()
+        if target is None:
+            return self._threads.get(threading.get_ident(), self.stream)
+        return target
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        self._current().flush()
+
+    def getvalue(self):
+        return str(self._current().getvalue())
+
+    def writelines(self, lines):
+        self._current().writelines(lines)
+
+    def write(self, s):
+        return self._current().write(s)
+
+
+class _OutputRouting(object):
+    """
+    Installs a `_CaptureRouter` as sys.stdout and sys.stderr as long as at
+    least one test captures its output through them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self.stdout = None
+        self.stderr = None
+
+    def acquire(self):
+        with self._lock:
+            if not self._count:
+                self.stdout = _CaptureRouter(sys.stdout, 'stdout')
+                self.stderr = _CaptureRouter(sys.stderr, 'stderr')
+                sys.stdout = self.stdout
+                sys.stderr = self.stderr
+            self._count += 1
+            return self.stdout, self.stderr
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+            if not self._count:
+                sys.stdout = self.stdout.stream
+                sys.stderr = self.stderr.stream
+                self.stdout = None
+                self.stderr = None
+
+
+_output_routing = _OutputRouting()
+
+
+class _SpillFile(object):
+    """
+    Anonymous temporary file the captured output of tests is appended to.
+
+    Outputs may be read by the background report writer while the output of
+    the following tests is appended, so accesses are serialized.
+    """
+
+    _ENCODING = 'utf-8'
+    _ERRORS = 'surrogatepass'
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def append(self, text):
+        """
+        Appends `text` and returns the offset where it starts.
+        """
+        data = text.encode(self._ENCODING, self._ERRORS)
+        with self._lock:
+            self._file.seek(0, io.SEEK_END)
+            self._file.write(data)
+            start, self.size = self.size, self.size + len(data)
+        return start
+
+    def read(self, start, end):
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start)
+
+
+class _SpilledOutput(object):
+    """
+    Captured output of a test stored in a `_SpillFile`, reported without
+    being loaded in memory at once.
+    """
+
+    __slots__ = ('_file', '_start', '_end')
+
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, spill_file, start, end):
+        self._file = spill_file
+        self._start = start
+        self._end = end
+
+    def __bool__(self):
+        return self._end > self._start
+
+    def __str__(self):
+        return ''.join(self.chunks())
+
+    def __reduce__(self):
+        # sent to other processes as a plain string
+        return (str, (str(self),))
+
+    def chunks(self):
+        """
+        Yields the output in pieces of at most `_CHUNK_SIZE` bytes.
+        """
+        decoder = codecs.getincrementaldecoder(
+            _SpillFile._ENCODING)(_SpillFile._ERRORS)
+        pos = self._start
+        while pos < self._end:
+            end = min(pos + self._CHUNK_SIZE, self._end)
+            yield decoder.decode(self._file.read(pos, end), end == self._end)
+            pos = end
+
+
+class _OutputCapture(io.TextIOBase):
+    """
+    Captures the output of a test in memory, or in a temporary file once it
+    is longer than `threshold` characters. `getvalue` returns a string in
+    the first case, and a `_SpilledOutput` in the second.
+    """
+
+    def __init__(self, threshold):
+        super(_OutputCapture, self).__init__()
+        self._threshold = threshold
+        self._memory = StringIO()
+        self._file = None
+        # offset in the spill file of the output of the current test, if
+        # it was spilled
+        self._start = None
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if self._start is not None:
+            self._file.append(s)
+            return len(s)
+        self._memory.write(s)
+        if self._memory.tell() > self._threshold:
+            if self._file is None:
+                self._file = _SpillFile()
+            self._start = self._file.append(self._memory.getvalue())
+            self._memory.seek(0)
+            self._memory.truncate()
+        return len(s)
+
+    def getvalue(self):
+        if self._start is None:
+            return self._memory.getvalue()
+        return _SpilledOutput(self._file, self._start, self._file.size)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        self._start = None
+        return self._memory.seek(pos, whence)
+
+    def truncate(self, pos=None):
+        return self._memory.truncate(pos)
+
+
+class _BoundedOutputCapture(io.TextIOBase):
+    """
+    Captures the first `head` and the last `tail` characters of the output
+    of a test. The characters in between are dropped, and replaced by a
+    marker telling how many of them there were.
+    """
+
+    _MARKER = '\n[... %d characters dropped ...]\n'
+
+    def __init__(self, head, tail):
+        super(_BoundedOutputCapture, self).__init__()
+        self._head_size = head
+        self._tail_size = tail
+        self._reset()
+
+    def _reset(self):
+        self._head = StringIO()
+        self._head_length = 0
+        self._tail = collections.deque()
+        self._tail_length = 0
+        self._dropped = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        length = len(s)
+        room = self._head_size - self._head_length
+        if room > 0:
+            self._head.write(s[:room])
+            self._head_length += min(room, length)
+            s = s[room:]
+        if s:
+            self._tail.append(s)
+            self._tail_length += len(s)
+            excess = self._tail_length - self._tail_size
+            while excess > 0:
+                first = self._tail[0]
+                if len(first) <= excess:
+                    self._tail.popleft()
+                    dropped = len(first)
+                else:
+                    self._tail[0] = first[excess:]
+                    dropped = excess
+                self._tail_length -= dropped
+                self._dropped += dropped
+                excess -= dropped
+        return length
+
+    def getvalue(self):
+        value = self._head.getvalue()
+        if self._dropped:
+            value += self._MARKER % self._dropped
+        return value + ''.join(self._tail)
+
+    # the capture can only be emptied, with seek(0) and truncate()
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if pos or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('can only seek to the start')
+        return 0
+
+    def truncate(self, pos=None):
+        if pos:
+            raise io.UnsupportedOperation('can only truncate to the start')
+        self._reset()
+        return 0
+
+
+class _FdCapture(io.TextIOBase):
+    """
+    Captures what is written to the file descriptor `fd` (1 or 2) while a
+    test runs, by Python code as well as by C extensions and child processes,
+    into the output capture of the test.
+
+    The file descriptor is redirected with os.dup2 to an anonymous temporary
+    file, which is kept for the whole run and emptied after each test. While
+    capturing, this object also replaces sys.stdout or sys.stderr and writes
+    to the file descriptor directly, so that the output of Python code stays
+    in order with the rest. The captured bytes are decoded as UTF-8 and, with
+    `echo`, written to the original file descriptor as well.
+    """
+
+    _ENCODING = 'utf-8'
+    _ERRORS = 'backslashreplace'
+
+    def __init__(self, fd):
+        super(_FdCapture, self).__init__()
+        self.fd = fd
+        self._file = tempfile.TemporaryFile(buffering=0)
+        self._decoder = codecs.getincrementaldecoder(self._ENCODING)(
+            'replace')
+        self._saved_fd = None
+        self._stream = None
+        self._capture = None
+        self._echo = False
+
+    @property
+    def encoding(self):
+        return self._ENCODING
+
+    @property
+    def errors(self):
+        return self._ERRORS
+
+    def writable(self):
+        return True
+
+    def fileno(self):
+        return self.fd
+
+    def start(self, stream, capture, echo):
+        """
+        Redirects the file descriptor until `stop` is called. `stream` is the
+        sys.stdout or sys.stderr replaced, the output is written to
+        `capture`.
+        """
+        # what was written before the test is not part of its output
+        stream.flush()
+        self._stream = stream
+        self._capture = capture
+        self._echo = echo
+        self._saved_fd = os.dup(self.fd)
+        os.dup2(self._file.fileno(), self.fd)
+
+    def stop(self):
+        if self._saved_fd is None:
+            return
+        self.drain(final=True)
+        os.dup2(self._saved_fd, self.fd)
+        os.close(self._saved_fd)
+        self._saved_fd = None
+        self._stream = None
+        self._capture = None
+
+    def write(self, s):
+        data = s.encode(self._ENCODING, self._ERRORS)
+        while data:
+            data = data[os.write(self.fd, data):]
+        return len(s)
+
+    def drain(self, final=False):
+        """
+        Moves what was written to the file descriptor so far to the output
+        capture, and empties the temporary file.
+        """
+        if self._saved_fd is None:
+            return
+        # the replaced stream may still be used, e.g. by logging handlers
+        self._stream.flush()
+        fileno = self._file.fileno()
+        # all the duplicates of the file descriptor share this offset
+        size = os.lseek(fileno, 0, os.SEEK_CUR)
+        data = b''
+        if size:
+            os.lseek(fileno, 0, os.SEEK_SET)
+            data = self._file.read(size)
+            os.ftruncate(fileno, 0)
+            os.lseek(fileno, 0, os.SEEK_SET)
+            if self._echo:
+                echoed = data
+                while echoed:
+                    echoed = echoed[os.write(self._saved_fd, echoed):]
+        text = self._decoder.decode(data, final)
+        if text:
+            self._capture.write(text)
+
+    def getvalue(self):
+        self.drain()
+        return str(self._capture.getvalue())
+
+
+class _LocalRepr(reprlib.Repr):
+    """
+    Computes the repr of local variables in tracebacks, rendering at most
+    `max_length` items of containers and keeping at most `max_length`
+    characters of the result.
+    """
+
+    def __init__(self, max_length):
+        reprlib.Repr.__init__(self)
+        self.max_length = max_length
+        for name in ('maxtuple', 'maxlist', 'maxarray', 'maxdict', 'maxset',
+                     'maxfrozenset', 'maxdeque', 'maxstring', 'maxlong',
+                     'maxother'):
+            setattr(self, name, max_length)
+
+    def repr(self, x):
+        text = reprlib.Repr.repr(self, x)
+        if len(text) > self.max_length:
+            text = text[:max(self.max_length - 3, 0)] + '...'
+        return text
+
+
+class _TracebackFormatter(object):
+    """
+    Formats tracebacks with bounded work and size: only the innermost
+    `max_frames` frames of each exception are formatted, the repr of each
+    local variable is limited to `max_local_repr` characters, and only the
+    first and last `max_size` / 2 characters of the traceback are kept, see
+    `_BoundedOutputCapture`. None means no limit.
+
+    The repr of objects other than builtin containers, strings and numbers
+    is still computed in full before being cut.
+    """
+
+    def __init__(self, max_frames=None, max_local_repr=None, max_size=None):
+        self.max_frames = max_frames
+        self.max_size = max_size
+        if max_local_repr is None:
+            self._repr = None
+        else:
+            self._repr = _LocalRepr(max_local_repr)
+
+    def format(self, exctype, value, tb, capture_locals=False):
+        """
+        Returns the text of the traceback of an exception, like
+        `traceback.TracebackException.format`.
+        """
+        limit = None
+        if self.max_frames is not None:
+            limit = -self.max_frames if self.max_frames else 0
+        tb_e = traceback.TracebackException(
+            exctype, value, tb, limit=limit,
+            capture_locals=capture_locals and self._repr is None,
+            compact=True)
+        if capture_locals and self._repr is not None:
+            self._capture_locals(tb_e, value, tb)
+
+        if self.max_size is None:
+            return ''.join(tb_e.format())
+        head = self.max_size // 2
+        output = _BoundedOutputCapture(head, self.max_size - head)
+        for line in tb_e.format():
+            output.write(line)
+        return output.getvalue()
+
+    def _capture_locals(self, tb_e, value, tb):
+        """
+        Sets the bounded repr of the local variables of the frames of `tb` in
+        the matching frame summaries of `tb_e`, and in its chained exceptions.
+        """
+        frames = [frame for frame, _ in traceback.walk_tb(tb)]
+        if self.max_frames is not None:
+            frames = frames[max(len(frames) - self.max_frames, 0):]
+        for summary, frame in zip(tb_e.stack, frames):
+            summary.locals = dict(
+                (name, self._repr.repr(local))
+                for name, local in frame.f_locals.items()) or None
+
+        for name in ('__cause__', '__context__'):
+            chained = getattr(tb_e, name)
+            if chained is not None:
+                exc = getattr(value, name)
+                self._capture_locals(chained, exc, exc.__traceback__)
+        for chained, exc in zip(getattr(tb_e, 'exceptions', None) or (),
+                                getattr(value, 'exceptions', ())):
+            self._capture_locals(chained, exc, exc.__traceback__)
+
+
+_OUTPUT_MARKER = 'xmlrunner-output:%d'
+_OUTPUT_MARKER_RE = re.compile(
+    br'(<system-(?:out|err)>)\s*<!--xmlrunner-output:(\d+)-->\s*'
+    br'(</system-(?:out|err)>)')
+
+
+def _append_spilled_output(xml_document, node, output):
+    """
+    Appends a marker to `node` where `_write_content` writes `output`.
+    """
+    outputs = getattr(xml_document, 'spilled_outputs', None)
+    if outputs is None:
+        outputs = xml_document.spilled_outputs = []
+    node.appendChild(
+        xml_document.createComment(_OUTPUT_MARKER % len(outputs)))
+    outputs.append(output)
+
+
+def _write_spilled_output(output, stream, encoding):
+    """
+    Writes `output` as CDATA sections, split like `_createCDATAsections`
+    does, one chunk at a time.
+    """
+    stream.write(b'<![CDATA[')
+    # the end of the previous chunk, ']]>' may span two chunks
+    previous = ''
+    for chunk in output.chunks():
+        text = previous + safe_unicode(chunk)
+        # the escaping only inserts text before a '>' of this chunk
+        escaped = text.replace(']]>', ']]]]><![CDATA[>')[len(previous):]
+        stream.write(escaped.encode(encoding, 'xmlcharrefreplace'))
+        previous = text[-2:]
+    stream.write(b']]>')
+
+
+def _write_content(xml_content, stream, xml_document, encoding):
+    """
+    Writes `xml_content`, serialized from `xml_document`, to `stream` with
+    the spilled outputs in place of their markers.
+    """
+    outputs = getattr(xml_document, 'spilled_outputs', None)
+    if not outputs:
+        stream.write(xml_content)
+        return
+    pos = 0
+    for match in _OUTPUT_MARKER_RE.finditer(xml_content):
+        stream.write(xml_content[pos:match.end(1)])
+        _write_spilled_output(
+            outputs[int(match.group(2))], stream, encoding)
+        stream.write(match.group(3))
+        pos = match.end()
+    stream.write(xml_content[pos:])
+
+
+class _TestSuiteSummary(object):
+    """
+    Totals of a testsuite, as reported in the attributes of its XML element.
+    """
+
+    def __init__(self, tests=()):
+        self.tests = 0
+        self.time = 0
+        self.timestamp = None
+        self.failures = 0
+        self.errors = 0
+        self.skipped = 0
+        for test_info in tests:
+            self.add(test_info)
+
+    def add(self, test_info):
+        self.tests += 1
+        self.time += test_info.elapsed_time
+        if self.timestamp is None or test_info.timestamp > self.timestamp:
+            self.timestamp = test_info.timestamp
+        if test_info.outcome == test_info.FAILURE:
+            self.failures += 1
+        elif test_info.outcome == test_info.ERROR:
+            self.errors += 1
+        elif test_info.outcome == _TestInfo.SKIP:
+            self.skipped += 1
+
+    def finish(self, test_info):
+        """
+        Adds the time of a test counted by `add` before it finished.
+        """
+        self.time += test_info.elapsed_time
+        if test_info.timestamp > self.timestamp:
+            self.timestamp = test_info.timestamp
+
+
+class _SpooledTestSuite(object):
+    """
+    Location of the testcases of a testsuite inside a `_ReportSpool`.
+    """
+
+    def __init__(self, index, order):
+        self.index = index
+        self.order = order
+        self.summary = _TestSuiteSummary()
+        # report list index -> [[start, end], ...] byte ranges in the spool
+        self.segments = {}
+
+
+class _GroupedTestSuite(object):
+    """
+    Tests of a testsuite and their totals, maintained as the tests are added
+    to the result lists, in the order they are reported with.
+    """
+
+    def __init__(self, order):
+        self.order = order
+        self.summary = _TestSuiteSummary()
+        # report list index -> [test_info, ...]
+        self.tests = {}
+
+    def add(self, test_info, report_list):
+        tests = self.tests.get(report_list)
+        if tests is None:
+            tests = self.tests[report_list] = []
+        tests.append(test_info)
+        self.summary.add(test_info)
+
+    def all_tests(self):
+        return [test_info for report_list in sorted(self.tests)
+                for test_info in self.tests[report_list]]
+
+
+class _ReportSpool(object):
+    """
+    Temporary file holding the serialized <testcase> elements of a test run.
+
+    Testcases are written as soon as their test stops; only the totals of each
+    testsuite are kept in memory. When the reports are generated, the
+    testsuite elements are built from those totals and the spooled testcases
+    are copied into them.
+    """
+
+    _MARKER = 'xmlrunner-spool:%d'
+    _MARKER_RE = re.compile(br'[ \t]*<!--xmlrunner-spool:(\d+)-->\n?')
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, report_testcase, report_names, document, encoding,
+                 level, pretty=True):
+        self._report_testcase = report_testcase
+        self._report_names = report_names
+        self._document = document
+        self._encoding = encoding
+        self._level = level
+        if pretty:
+            self._indent, self._newl = '\t', '\n'
+        else:
+            self._indent, self._newl = '', ''
+        self._file = tempfile.TemporaryFile()
+        self._size = 0
+        self._last_segment = None
+        self._suites = {}
+        self._count = 0
+
+    def add(self, test_info, report_list):
+        """
+        Serializes the testcase of `test_info` at the end of the spool.
+        """
+        suite = self._suites.get(test_info.test_name)
+        if suite is None:
+            suite = _SpooledTestSuite(
+                len(self._suites), (report_list, self._count))
+            self._suites[test_info.test_name] = suite
+        suite.order = min(suite.order, (report_list, self._count))
+        suite.summary.add(test_info)
+        self._count += 1
+
+        parent = self._document.createElement('testsuite')
+        self._report_testcase(
+            test_info, parent, self._document, self._report_names)
+        data = self._document.serialize_children(
+            parent, self._level, self._encoding, self._indent, self._newl)
+        _write_content(data, self._file, self._document, self._encoding)
+        if getattr(self._document, 'spilled_outputs', None):
+            del self._document.spilled_outputs[:]
+
+        start, self._size = self._size, self._file.tell()
+        segments = suite.segments.setdefault(report_list, [])
+        if segments and segments[-1] is self._last_segment:
+            segments[-1][1] = self._size
+        else:
+            self._last_segment = [start, self._size]
+            segments.append(self._last_segment)
+
+    def suites(self):
+        """
+        Returns the spooled testsuites, in the order the results would have
+        been reported without spooling.
+        """
+        return dict(sorted(self._suites.items(),
+                           key=lambda item: item[1].order))
+
+    def report_testsuite(self, suite_name, suite, xml_document, parentElement,
+                         properties):
+        """
+        Appends an empty testsuite section to the XML document, with a marker
+        where its spooled testcases go.
+        """
+        testsuite = _XMLTestResult._report_testsuite_header(
+            suite_name, suite.summary, xml_document, parentElement,
+            properties)
+        testsuite.appendChild(
+            xml_document.createComment(self._MARKER % suite.index))
+        return testsuite
+
+    def write(self, xml_content, stream):
+        """
+        Writes `xml_content`, a serialized document built with
+        `report_testsuite`, to `stream` with the spooled testcases in place of
+        the markers.
+        """
+        suites = dict((suite.index, suite) for suite in self._suites.values())
+        self._file.flush()
+        pos = 0
+        for match in self._MARKER_RE.finditer(xml_content):
+            stream.write(xml_content[pos:match.start()])
+            pos = match.end()
+            segments = suites[int(match.group(1))].segments
+            for report_list in sorted(segments):
+                for start, end in segments[report_list]:
+                    self._copy(start, end, stream)
+        stream.write(xml_content[pos:])
+
+    def _copy(self, start, end, stream):
+        self._file.seek(start)
+        while start < end:
+            chunk = self._file.read(min(self._CHUNK_SIZE, end - start))
+            stream.write(chunk)
+            start += len(chunk)
+        self._file.seek(0, io.SEEK_END)
+
+    def close(self):
+        self._file.close()
+
+
+def _intern(value):
+    """
+    Interns `value` if it is a string, so that records of tests of the same
+    class share their class name, filename, etc.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+_last_timestamp = (None, None)
+
+
+def _timestamp(seconds):
+    """
+    Returns the ISO 8601 local time of `seconds`, without microseconds. The
+    last one is cached, since consecutive tests mostly stop in the same
+    second.
+    """
+    global _last_timestamp
+    second = seconds // 1
+    last_second, timestamp = _last_timestamp
+    if second != last_second:
+        timestamp = datetime.datetime.fromtimestamp(second).isoformat()
+        timestamp = _intern(timestamp)
+        _last_timestamp = (second, timestamp)
+    return timestamp
+
+
 class _TestInfo(object):
     """
     This class keeps useful information about the execution of a
     test method.
+
+    Instances are kept for every test of a run: attributes are slots, strings
+    shared by many tests are interned, and the reference to the test result
+    is dropped when the test is finished. Subclasses used as `infoclass`
+    without `__slots__` may still set any attribute.
+
+    Passing tests without output are recorded with `passed`, which computes
+    their description when it is first used: it is mostly printed for tests
+    with errors.
     """
 
+    __slots__ = ('test_result', 'outcome', 'elapsed_time', 'timestamp',
+                 'test_exception_name', 'test_exception_message',
+                 'stdout', 'stderr', '_test_description', '_describe',
+                 'test_exception_info', 'test_name', 'test_id',
+                 'filename', 'lineno', 'doc')
+
     # Possible test outcomes
     (SUCCESS, FAILURE, ERROR, SKIP) = range(4)
 
@@ -143,11 +1021,13 @@ class _TestInfo(object):
         SKIP: 'skipped',
     }
 
+    _NO_TIMESTAMP = datetime.datetime.min.replace(microsecond=0).isoformat()
+
     def __init__(self, test_result, test_method, outcome=SUCCESS, err=None, subTest=None, filename=None, lineno=None, doc=None):
         self.test_result = test_result
         self.outcome = outcome
         self.elapsed_time = 0
-        self.timestamp = datetime.datetime.min.replace(microsecond=0).isoformat()
+        self.timestamp = self._NO_TIMESTAMP
         if err is not None:
             if self.outcome != _TestInfo.SKIP:
                 self.test_exception_name = safe_unicode(err[0].__name__)
@@ -165,17 +1045,69 @@ class _TestInfo(object):
                     err, test_method)
         )
 
-        self.test_name = testcase_name(test_method)
+        self.test_name = test_result._report_names.testcase_name(test_method)
         self.test_id = test_method.id()
 
         if subTest:
             self.test_id = subTest.id()
             self.test_description = self.test_result.getDescription(subTest)
 
-        self.filename = filename
+        self.filename = _intern(filename)
         self.lineno = lineno
         self.doc = doc
 
+    @classmethod
+    def passed(cls, test_result, test_method):
+        """
+        Returns the info of a test that passed without output, with only the
+        attributes needed to report it. Its description is computed from
+        `test_result` and `test_method` when it is first used.
+        """
+        self = cls.__new__(cls)
+        self.test_result = test_result
+        self.outcome = cls.SUCCESS
+        self.elapsed_time = 0
+        self.timestamp = cls._NO_TIMESTAMP
+        self.stdout = self.stderr = self.test_exception_info = ''
+        self._test_description = None
+        self._describe = functools.partial(
+            test_result.getDescription, test_method)
+        self.test_name = test_result._report_names.testcase_name(test_method)
+        self.test_id = test_method.id()
+        self.filename = self.lineno = self.doc = None
+        return self
+
+    def __getstate__(self):
+        # the test result is only needed while the test runs; dropping it
+        # allows reports to be generated in other processes.
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        state['test_result'] = None
+        # the description cannot be computed without the test result
+        state['_test_description'] = self.test_description
+        state['_describe'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def test_description(self):
+        describe = self._describe
+        if describe is not None:
+            self._describe = None
+            self._test_description = describe()
+        return self._test_description
+
+    @test_description.setter
+    def test_description(self, description):
+        self._describe = None
+        self._test_description = description
+
     def id(self):
         return self.test_id
 
@@ -184,8 +1116,8 @@ class _TestInfo(object):
         """
         self.elapsed_time = \
             self.test_result.stop_time - self.test_result.start_time
-        timestamp = datetime.datetime.fromtimestamp(self.test_result.stop_time)
-        self.timestamp = timestamp.replace(microsecond=0).isoformat()
+        self.timestamp = _timestamp(self.test_result.stop_time)
+        self.test_result = None
 
     def get_error_info(self):
         """
@@ -198,12 +1130,240 @@ class _TestInfo(object):
         return self.test_description
 
 
+def _report_content(doc, test_runner):
+    """
+    Serializes a XML report document with the settings of `test_runner`.
+    """
+    if not test_runner.pretty:
+        return doc.toxml(encoding=test_runner.encoding)
+    return doc.toprettyxml(
+        indent='\t',
+        encoding=test_runner.encoding
+    )
+
+
+@contextlib.contextmanager
+def _report_stream(stream, test_runner):
+    """
+    Yields the binary stream a report is written to: `stream` itself, or a
+    compressor writing into it when `test_runner.compress` is set.
+    """
+    if not test_runner.compress:
+        yield stream
+        return
+    compressed = open_compressed(stream, test_runner.compress)
+    try:
+        yield compressed
+    finally:
+        compressed.close()
+
+
+class _ReportSettings(object):
+    """
+    Report settings of a XMLTestRunner, which unlike the runner itself can be
+    sent to worker processes.
+    """
+
+    def __init__(self, test_runner):
+        self.encoding = test_runner.encoding
+        self.pretty = test_runner.pretty
+        self.compress = test_runner.compress
+        self.report_backend = test_runner.report_backend
+
+
+def _testsuite_name(suite, test_runner):
+    """
+    Returns the name of a testsuite in its report.
+    """
+    if test_runner.outsuffix:
+        # not checking with 'is not None', empty means no suffix.
+        return '%s-%s' % (suite, test_runner.outsuffix)
+    return suite
+
+
+def _testsuite_report_name(suite, test_runner):
+    """
+    Returns the report filename and the name of a testsuite written to a
+    directory.
+    """
+    suite_name = _testsuite_name(suite, test_runner)
+    filename = path.join(
+        test_runner.output,
+        'TEST-%s.xml%s' % (suite_name, filename_suffix(test_runner.compress)))
+    return filename, suite_name
+
+
+def _write_testsuite_report(filename, suite_name, tests, properties,
+                            settings, report_names):
+    """
+    Builds the report of a single testsuite and writes it to `filename`.
+    """
+    doc = document_class(settings.report_backend)()
+    _XMLTestResult._report_testsuite(suite_name, tests, doc, doc, properties,
+                                     report_names=report_names)
+    with open(filename, 'wb') as report_file, \
+            _report_stream(report_file, settings) as stream:
+        _write_content(
+            _report_content(doc, settings), stream, doc, settings.encoding)
+    return filename
+
+
+class _BackgroundReportWriter(object):
+    """
+    Thread writing the report files of testsuites whose tests are done.
+
+    A testsuite is considered done when a test of another one starts. If more
+    of its tests are reported afterwards, it is left to `generate_reports` to
+    write its report again with all of them.
+    """
+
+    def __init__(self, test_runner, properties, report_names):
+        self._settings = _ReportSettings(test_runner)
+        self._test_runner = test_runner
+        self._properties = properties
+        self._report_names = report_names
+        # testsuite -> report list index -> tests
+        self._testsuites = {}
+        self._queue = Queue()
+        self._filenames = []
+        self._error = None
+        self._done = set()
+        self._stale = set()
+        if not os.path.exists(test_runner.output):
+            os.makedirs(test_runner.output)
+        self._thread = threading.Thread(
+            target=self._run, name='xmlrunner-report-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def written(self):
+        """
+        Testsuites whose report was written with all their tests.
+        """
+        return self._done - self._stale
+
+    def add(self, test_info, report_list):
+        suite = test_info.test_name
+        if suite in self._done:
+            self._stale.add(suite)
+            return
+        lists = self._testsuites.setdefault(suite, {})
+        lists.setdefault(report_list, []).append(test_info)
+
+    def testsuite_done(self, suite):
+        lists = self._testsuites.pop(suite, None)
+        if lists is None:
+            return
+        tests = [test_info for report_list in sorted(lists)
+                 for test_info in lists[report_list]]
+        self._done.add(suite)
+        self._queue.put((suite, tests))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            if self._error is not None:
+                continue
+            suite, tests = job
+            filename, suite_name = _testsuite_report_name(
+                suite, self._test_runner)
+            try:
+                _write_testsuite_report(
+                    filename, suite_name, tests, self._properties,
+                    self._settings, self._report_names)
+            except Exception as e:
+                self._error = e
+            else:
+                self._filenames.append(filename)
+
+    def close(self):
+        """
+        Waits for the queued reports to be written and returns their
+        filenames.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._filenames
+
+
+class _SourceIndex(object):
+    """
+    Locates the source of test classes and methods, caching the source file
+    of each class and the availability of the source of each file for the
+    run, and reading the first line of methods from their code object.
+
+    This gives the same results as `inspect.getsourcefile` and
+    `inspect.getsourcelines`, without tokenizing the source of every test.
+    """
+
+    def __init__(self):
+        self._class_files = {}
+        self._code_files = {}
+
+    def filename(self, test_class):
+        """
+        Returns the source file of `test_class`, like `inspect.getsourcefile`.
+        """
+        try:
+            return self._class_files[test_class]
+        except KeyError:
+            filename = inspect.getsourcefile(test_class)
+            self._class_files[test_class] = filename
+            return filename
+
+    def lineno(self, function):
+        """
+        Returns the first line of `function`, like `inspect.getsourcelines`:
+        decorated functions start at their first decorator. Raises `OSError`
+        when its source is not available.
+        """
+        if hasattr(function, '__wrapped__'):
+            function = inspect.unwrap(function)
+        code = getattr(getattr(function, '__func__', function),
+                       '__code__', None)
+        if code is None:
+            # not a Python function: let inspect work it out, or fail
+            return inspect.getsourcelines(function)[1]
+        try:
+            available = self._code_files[code.co_filename]
+        except KeyError:
+            try:
+                inspect.getsourcelines(function)
+                available = True
+            except OSError:
+                available = False
+            self._code_files[code.co_filename] = available
+        if not available:
+            raise OSError('could not get source code')
+        return code.co_firstlineno
+
+
 class _XMLTestResult(TextTestResult):
     """
     A test result class that can express test results in a XML report.
 
     Used by XMLTestRunner.
     """
+
+    # Result lists, in the order their tests are reported.
+    _report_lists = ('successes', 'failures', 'errors', 'skipped',
+                     'expectedFailures', 'unexpectedSuccesses')
+
+    # Outcomes printed for the tests of each result list, verbose and short.
+    _report_outcomes = {
+        'successes': ('ok', '.'),
+        'failures': ('FAIL', 'F'),
+        'errors': ('ERROR', 'E'),
+        'skipped': ('skip', 's'),
+        'expectedFailures': ('expected failure', 'x'),
+        'unexpectedSuccesses': ('unexpected success', 'u'),
+    }
+
     def __init__(self, stream=sys.stderr, descriptions=1, verbosity=1,
                  elapsed_times=True, properties=None, infoclass=None):
         TextTestResult.__init__(self, stream, descriptions, verbosity)
@@ -213,58 +1373,108 @@ class _XMLTestResult(TextTestResult):
         self.__stdout_saved = None
         self._stderr_capture = StringIO()
         self.__stderr_saved = None
+        self._stdout_writer = None
+        self._stderr_writer = None
+        self._fd_captures = None
+        self._routing = False
+        self.__routes = None
         self.successes = []
         self.callback = None
+        self._outcome = None
+        self._print_outcome_callback = self._print_outcome
         self.elapsed_times = elapsed_times
         self.properties = properties  # junit testsuite properties
         self.filename = None
         self.lineno = None
         self.doc = None
+        self._source_index = _SourceIndex()
+        self._report_names = _ReportNames()
+        self._report_spool = None
+        self._report_writer = None
+        self._report_pending = []
+        self._deduplication = None
+        self._payloads = None
+        self._traceback_formatter = None
+        self._current_testsuite = None
+        self._testsuites = {}
+        self._grouped_tests = 0
         if infoclass is None:
             self.infoclass = _TestInfo
         else:
             self.infoclass = infoclass
 
     def _prepare_callback(self, test_info, target_list, verbose_str,
-                          short_str):
+                          short_str, report_list='successes'):
         """
         Appends a `infoclass` to the given target list and sets a callback
         method to be called by stopTest method.
+
+        When streaming reports, the `infoclass` is queued for the report spool
+        instead. It is also queued for the background report writer, if any;
+        `report_list` names the result list it is reported with.
         """
-        test_info.filename = self.filename
+        test_info.filename = _intern(self.filename)
         test_info.lineno = self.lineno
         test_info.doc = self.doc
-        target_list.append(test_info)
-
-        def callback():
-            """Prints the test method outcome to the stream, as well as
-            the elapsed time.
-            """
+        report_list = self._report_lists.index(report_list)
+        if self._report_spool is None:
+            target_list.append(test_info)
+            self._group_test(test_info, report_list)
+        if self._report_spool is not None or self._report_writer is not None:
+            self._report_pending.append((test_info, report_list))
+
+        self._outcome = (test_info, verbose_str, short_str)
+        self.callback = self._print_outcome_callback
+
+    def _print_outcome(self):
+        """Prints the test method outcome to the stream, as well as
+        the elapsed time.
+        """
+        test_info, verbose_str, short_str = self._outcome
+        self._outcome = None
 
-            test_info.test_finished()
+        test_info.test_finished()
+        suite = self._testsuites.get(test_info.test_name)
+        if suite is not None:
+            suite.summary.finish(test_info)
 
-            # Ignore the elapsed times for a more reliable unit testing
-            if not self.elapsed_times:
-                self.start_time = self.stop_time = 0
+        # Ignore the elapsed times for a more reliable unit testing
+        if not self.elapsed_times:
+            self.start_time = self.stop_time = 0
 
-            if self.showAll:
-                self.stream.writeln(
-                    '%s (%.3fs)' % (verbose_str, test_info.elapsed_time)
-                )
-            elif self.dots:
-                self.stream.write(short_str)
+        self._write_outcome(test_info, verbose_str, short_str)
 
-            self.stream.flush()
+    def _write_outcome(self, test_info, verbose_str, short_str):
+        if self.showAll:
+            self.stream.writeln(
+                '%s (%.3fs)' % (verbose_str, test_info.elapsed_time)
+            )
+        elif self.dots:
+            self.stream.write(short_str)
 
-        self.callback = callback
+        self.stream.flush()
 
     def startTest(self, test):
         """
         Called before execute each test method.
         """
         self.start_time = time()
+        if self.showAll:
+            # before the output, and the file descriptors with capture_fd,
+            # are captured
+            self.stream.write('  ' + self.getDescription(test))
+            self.stream.write(" ... ")
+            self.stream.flush()
         TestResult.startTest(self, test)
 
+        if self._report_writer is not None:
+            testsuite = self._report_names.testcase_name(test)
+            if testsuite != self._current_testsuite:
+                if self._current_testsuite is not None:
+                    self._report_writer.testsuite_done(
+                        self._current_testsuite)
+                self._current_testsuite = testsuite
+
         try:
             if getattr(test, '_dt_test', None) is not None:
                 # doctest.DocTestCase
@@ -275,10 +1485,10 @@ class _XMLTestResult(TextTestResult):
                 test_method = getattr(test, test._testMethodName)
                 test_class = type(test)
                 # Note: inspect can get confused with decorators, so use class.
-                self.filename = inspect.getsourcefile(test_class)
+                self.filename = self._source_index.filename(test_class)
                 # Handle partial and partialmethod objects.
                 test_method = getattr(test_method, 'func', test_method)
-                _, self.lineno = inspect.getsourcelines(test_method)
+                self.lineno = self._source_index.lineno(test_method)
 
                 self.doc = test_method.__doc__
         except (AttributeError, IOError, TypeError):
@@ -286,25 +1496,96 @@ class _XMLTestResult(TextTestResult):
             # some frameworks can make test method opaque.
             pass
 
-        if self.showAll:
-            self.stream.write('  ' + self.getDescription(test))
-            self.stream.write(" ... ")
-            self.stream.flush()
-
     def _setupStdout(self):
         """
         Capture stdout / stderr by replacing sys.stdout / sys.stderr
+
+        With `buffer`, nothing is echoed while the test runs: the captures are
+        used as the buffers of unittest instead of duplicating the output
+        into both. Spilled outputs are not strings, as unittest expects from
+        its buffers, so they are still duplicated.
+
+        When capturing file descriptors, sys.stdout / sys.stderr are replaced
+        by the `_FdCapture` of the file descriptors 1 / 2. When routing the
+        output, the captures are bound to the current context of the shared
+        `_CaptureRouter`.
         """
+        if self._routing:
+            stdout, stderr = _output_routing.acquire()
+            if self.buffer:
+                stdout_target = self._stdout_capture
+                stderr_target = self._stderr_capture
+            else:
+                stdout_target = self._duplicate_writer(
+                    '_stdout_writer', stdout.stream, self._stdout_capture)
+                stderr_target = self._duplicate_writer(
+                    '_stderr_writer', stderr.stream, self._stderr_capture)
+            self.__routes = ((stdout, stdout.bind(stdout_target)),
+                             (stderr, stderr.bind(stderr_target)))
+            return
+
+        if self._fd_captures is not None:
+            stdout, stderr = self._fd_captures
+            echo = not self.buffer
+            stdout.start(sys.stdout, self._stdout_capture, echo)
+            stderr.start(sys.stderr, self._stderr_capture, echo)
+            self.__stdout_saved = sys.stdout
+            self.__stderr_saved = sys.stderr
+            sys.stdout = stdout
+            sys.stderr = stderr
+            return
+
+        if self.buffer and not isinstance(self._stdout_capture,
+                                          _OutputCapture):
+            self._stdout_buffer = self._stdout_capture
+            self._stderr_buffer = self._stderr_capture
+            super(_XMLTestResult, self)._setupStdout()
+            return
+
         super(_XMLTestResult, self)._setupStdout()
         self.__stdout_saved = sys.stdout
-        sys.stdout = _DuplicateWriter(sys.stdout, self._stdout_capture)
+        sys.stdout = self._duplicate_writer(
+            '_stdout_writer', sys.stdout, self._stdout_capture)
         self.__stderr_saved = sys.stderr
-        sys.stderr = _DuplicateWriter(sys.stderr, self._stderr_capture)
+        sys.stderr = self._duplicate_writer(
+            '_stderr_writer', sys.stderr, self._stderr_capture)
 
     def _restoreStdout(self):
         """
         Stop capturing stdout / stderr and recover sys.stdout / sys.stderr
         """
+        if self.__routes is not None:
+            for router, token in self.__routes:
+                router.unbind(token)
+            self.__routes = None
+            _output_routing.release()
+            self._stdout_capture.seek(0)
+            self._stdout_capture.truncate()
+            self._stderr_capture.seek(0)
+            self._stderr_capture.truncate()
+            return
+
+        if self._fd_captures is not None:
+            # unittest buffers are not used
+            for capture in self._fd_captures:
+                capture.stop()
+            if self.__stdout_saved:
+                sys.stdout = self.__stdout_saved
+                self.__stdout_saved = None
+            if self.__stderr_saved:
+                sys.stderr = self.__stderr_saved
+                self.__stderr_saved = None
+            self._stdout_capture.seek(0)
+            self._stdout_capture.truncate()
+            self._stderr_capture.seek(0)
+            self._stderr_capture.truncate()
+            return
+
+        if self.buffer and self._stdout_buffer is self._stdout_capture:
+            # unittest echoes the output of failed tests and empties them
+            super(_XMLTestResult, self)._restoreStdout()
+            return
+
         if self.__stdout_saved:
             sys.stdout = self.__stdout_saved
             self.__stdout_saved = None
@@ -317,7 +1598,20 @@ class _XMLTestResult(TextTestResult):
         self._stderr_capture.truncate()
         super(_XMLTestResult, self)._restoreStdout()
 
+    def _duplicate_writer(self, name, stream, capture):
+        # the writers are kept for the following tests, as long as they
+        # duplicate the same streams
+        writer = getattr(self, name)
+        if (writer is None or writer._first is not stream or
+                writer._second is not capture):
+            writer = _DuplicateWriter(stream, capture)
+            setattr(self, name, writer)
+        return writer
+
     def _save_output_data(self):
+        if self._fd_captures is not None:
+            for capture in self._fd_captures:
+                capture.drain()
         self._stdout_data = self._stdout_capture.getvalue()
         self._stderr_data = self._stderr_capture.getvalue()
 
@@ -325,10 +1619,7 @@ class _XMLTestResult(TextTestResult):
         """
         Called after execute each test method.
         """
-        self._save_output_data()
-        # self._stdout_data = sys.stdout.getvalue()
-        # self._stderr_data = sys.stderr.getvalue()
-
+        # the output was saved when the outcome of the test was added
         TextTestResult.stopTest(self, test)
         self.stop_time = time()
 
@@ -336,14 +1627,225 @@ class _XMLTestResult(TextTestResult):
             self.callback()
             self.callback = None
 
+        self._flush_report_pending()
+
+    def stream_reports(self, test_runner):
+        """
+        Switches to streaming mode: testcases are written to a temporary spool
+        as soon as their test stops instead of being kept in memory until
+        `generate_reports` is called. Successful tests are not kept in
+        `successes` in this mode.
+        """
+        if isinstance(test_runner.output, str):
+            level = 1
+        else:
+            level = 2
+        document = document_class(test_runner.report_backend)()
+        self._report_spool = _ReportSpool(
+            self._report_testcase, self._report_names, document,
+            test_runner.encoding, level, test_runner.pretty)
+
+    def spill_output(self, threshold):
+        """
+        Captures the output of each test to a temporary file once it is
+        longer than `threshold` characters. Such outputs are kept as
+        `_SpilledOutput` handles and copied to the reports in chunks.
+        """
+        self._stdout_capture = _OutputCapture(threshold)
+        self._stderr_capture = _OutputCapture(threshold)
+
+    def limit_output(self, head, tail):
+        """
+        Captures only the first `head` and the last `tail` characters of the
+        output of each test, see `_BoundedOutputCapture`.
+        """
+        self._stdout_capture = _BoundedOutputCapture(head, tail)
+        self._stderr_capture = _BoundedOutputCapture(head, tail)
+
+    def capture_fds(self):
+        """
+        Captures the output written to the file descriptors 1 and 2 while
+        each test runs, including the output of C extensions and child
+        processes, instead of only what is written to sys.stdout and
+        sys.stderr. See `_FdCapture`.
+        """
+        if self._routing:
+            raise ValueError(
+                'file descriptors cannot be captured when routing the output')
+        self._fd_captures = (_FdCapture(1), _FdCapture(2))
+
+    def route_output(self):
+        """
+        Captures the output of each test through a `_CaptureRouter` shared by
+        all the results doing so, instead of replacing sys.stdout and
+        sys.stderr for the test. The output written by a test running
+        concurrently with others, in another thread or asyncio task, is
+        captured with its own output only, and the output of the threads not
+        running any test is not captured at all.
+        """
+        if self._fd_captures is not None:
+            raise ValueError(
+                'the output cannot be routed when capturing file descriptors')
+        self._routing = True
+
+    def limit_tracebacks(self, max_frames=None, max_local_repr=None,
+                         max_size=None):
+        """
+        Bounds the work and size of the formatting of tracebacks, see
+        `_TracebackFormatter`.
+        """
+        self._traceback_formatter = _TracebackFormatter(
+            max_frames, max_local_repr, max_size)
+
+    def deduplicate_payloads(self, mode):
+        """
+        Shares identical tracebacks and captured outputs between the tests
+        having them, so that each one is kept once in memory. The first
+        occurrence of each one is kept until the end of the run.
+
+        With `DEDUPLICATE_REFERENCE`, the tests after the first one are
+        reported with a short reference to it instead of the full text, and
+        `printErrors` ends with a summary of the repeated tracebacks.
+        """
+        if mode not in DEDUPLICATIONS:
+            raise ValueError('unknown deduplication: %r' % (mode,))
+        self._deduplication = mode
+        self._payloads = dict((name, {}) for name, _ in _PAYLOAD_KINDS)
+
+    def _deduplicate(self, test_info):
+        """
+        Replaces the traceback and outputs of `test_info` by the ones of the
+        first test having the same, or by a reference to them, when payloads
+        are deduplicated. Returns the full text of its traceback.
+        """
+        error_info = test_info.get_error_info()
+        if self._payloads is None:
+            return error_info
+        for name, kind in _PAYLOAD_KINDS:
+            text = getattr(test_info, name, None)
+            if not text or not isinstance(text, str):
+                # spilled outputs are not kept in memory
+                continue
+            payloads = self._payloads[name]
+            payload = payloads.get(text)
+            if payload is None:
+                payloads[text] = _Payload(text, kind, test_info.test_id)
+                continue
+            payload.count += 1
+            text = payload.text
+            if name == 'test_exception_info':
+                error_info = text
+            if self._deduplication == DEDUPLICATE_REFERENCE:
+                reference = payload.reference()
+                if len(reference) < len(text):
+                    text = reference
+            setattr(test_info, name, text)
+        return error_info
+
+    def pop_reported(self):
+        """
+        Returns the tests added so far as (result list name, entry) pairs,
+        `entry` being the item added to that result list, and removes them
+        from this result. Used by the workers of `XMLParallelTestRunner` to
+        send their tests to the parent process, see `add_reported`.
+        """
+        reported = []
+        for report_list in self._report_lists:
+            entries = getattr(self, report_list)
+            reported.extend((report_list, entry) for entry in entries)
+            del entries[:]
+        self._testsuites.clear()
+        self._grouped_tests = 0
+        return reported
+
+    def add_reported(self, report_list, entry, test=None):
+        """
+        Records a test run by another result, as returned by its
+        `pop_reported`, as if it was run by this one: its outcome is printed,
+        and it is deduplicated and reported with the tests of this result.
+        `test` is the test it was run for, if known.
+
+        The tests run by this result itself are counted by `testsRun`, the
+        others are not.
+        """
+        if report_list == 'successes':
+            test_info = entry
+        else:
+            test_info = entry[0]
+        if self.showAll:
+            description = test_info.test_description
+            if description is None:
+                description = (test_info.test_id if test is None
+                               else self.getDescription(test))
+            self.stream.write('  ' + description)
+            self.stream.write(' ... ')
+
+        if isinstance(self._stdout_capture, _OutputCapture):
+            self._spill_reported_output(test_info)
+        error_info = self._deduplicate(test_info)
+        if report_list in ('failures', 'errors'):
+            entry = (test_info, error_info)
+
+        index = self._report_lists.index(report_list)
+        if self._report_spool is None or report_list != 'successes':
+            getattr(self, report_list).append(entry)
+        if self._report_spool is None:
+            self._group_test(test_info, index)
+        if self._report_spool is not None or self._report_writer is not None:
+            self._report_pending.append((test_info, index))
+            self._flush_report_pending()
+
+        verbose_str, short_str = self._report_outcomes[report_list]
+        self._write_outcome(test_info, verbose_str, short_str)
+        if self.failfast and report_list in (
+                'failures', 'errors', 'unexpectedSuccesses'):
+            self.stop()
+
+    def _spill_reported_output(self, test_info):
+        """
+        Spills the outputs of a test run by another result with the outputs
+        of this one.
+        """
+        for name, capture in (('stdout', self._stdout_capture),
+                              ('stderr', self._stderr_capture)):
+            text = getattr(test_info, name)
+            if text:
+                capture.write(text)
+                setattr(test_info, name, capture.getvalue())
+                capture.seek(0)
+                capture.truncate()
+
+    def write_reports_in_background(self, test_runner):
+        """
+        Starts a thread writing the report file of each testsuite as soon as
+        the tests of the next one start, so that writing reports overlaps
+        with running the tests. Only used when reporting to a directory.
+        """
+        if isinstance(test_runner.output, str):
+            self._report_writer = _BackgroundReportWriter(
+                test_runner, self.properties, self._report_names)
+
+    def _flush_report_pending(self):
+        for test_info, report_list in self._report_pending:
+            if self._report_spool is not None:
+                self._report_spool.add(test_info, report_list)
+            if self._report_writer is not None:
+                self._report_writer.add(test_info, report_list)
+        del self._report_pending[:]
+
     def addSuccess(self, test):
         """
         Called when a test executes successfully.
         """
         self._save_output_data()
-        self._prepare_callback(
-            self.infoclass(self, test), self.successes, 'ok', '.'
-        )
+        if (self.infoclass is _TestInfo and not self._stdout_data and
+                not self._stderr_data):
+            # most tests: nothing to describe or deduplicate
+            testinfo = _TestInfo.passed(self, test)
+        else:
+            testinfo = self.infoclass(self, test)
+            self._deduplicate(testinfo)
+        self._prepare_callback(testinfo, self.successes, 'ok', '.')
 
     @failfast
     def addFailure(self, test, err):
@@ -353,11 +1855,9 @@ class _XMLTestResult(TextTestResult):
         self._save_output_data()
         testinfo = self.infoclass(
             self, test, self.infoclass.FAILURE, err)
-        self.failures.append((
-            testinfo,
-            self._exc_info_to_string(err, test)
-        ))
-        self._prepare_callback(testinfo, [], 'FAIL', 'F')
+        # the traceback is only formatted once, by the test info
+        self.failures.append((testinfo, self._deduplicate(testinfo)))
+        self._prepare_callback(testinfo, [], 'FAIL', 'F', 'failures')
 
     @failfast
     def addError(self, test, err):
@@ -367,11 +1867,8 @@ class _XMLTestResult(TextTestResult):
         self._save_output_data()
         testinfo = self.infoclass(
             self, test, self.infoclass.ERROR, err)
-        self.errors.append((
-            testinfo,
-            self._exc_info_to_string(err, test)
-        ))
-        self._prepare_callback(testinfo, [], 'ERROR', 'E')
+        self.errors.append((testinfo, self._deduplicate(testinfo)))
+        self._prepare_callback(testinfo, [], 'ERROR', 'E', 'errors')
 
     def addSubTest(self, testcase, test, err):
         """
@@ -382,25 +1879,26 @@ class _XMLTestResult(TextTestResult):
             errorText = None
             errorValue = None
             errorList = None
+            errorListName = None
             if issubclass(err[0], test.failureException):
                 errorText = 'FAIL'
                 errorValue = self.infoclass.FAILURE
                 errorList = self.failures
+                errorListName = 'failures'
 
             else:
                 errorText = 'ERROR'
                 errorValue = self.infoclass.ERROR
                 errorList = self.errors
+                errorListName = 'errors'
 
             self._save_output_data()
 
             testinfo = self.infoclass(
                 self, testcase, errorValue, err, subTest=test)
-            errorList.append((
-                testinfo,
-                self._exc_info_to_string(err, testcase)
-            ))
-            self._prepare_callback(testinfo, [], errorText, errorText[0])
+            errorList.append((testinfo, self._deduplicate(testinfo)))
+            self._prepare_callback(
+                testinfo, [], errorText, errorText[0], errorListName)
 
     def addSkip(self, test, reason):
         """
@@ -411,8 +1909,9 @@ class _XMLTestResult(TextTestResult):
             self, test, self.infoclass.SKIP, reason)
         testinfo.test_exception_name = 'skip'
         testinfo.test_exception_message = reason
+        self._deduplicate(testinfo)
         self.skipped.append((testinfo, reason))
-        self._prepare_callback(testinfo, [], 'skip', 's')
+        self._prepare_callback(testinfo, [], 'skip', 's', 'skipped')
 
     def addExpectedFailure(self, test, err):
         """
@@ -424,8 +1923,10 @@ class _XMLTestResult(TextTestResult):
         testinfo.test_exception_name = 'XFAIL'
         testinfo.test_exception_message = 'expected failure: {}'.format(testinfo.test_exception_message)
 
+        self._deduplicate(testinfo)
         self.expectedFailures.append((testinfo, self._exc_info_to_string(err, test)))
-        self._prepare_callback(testinfo, [], 'expected failure', 'x')
+        self._prepare_callback(
+            testinfo, [], 'expected failure', 'x', 'expectedFailures')
 
     @failfast
     def addUnexpectedSuccess(self, test):
@@ -440,9 +1941,37 @@ class _XMLTestResult(TextTestResult):
         testinfo.test_exception_name = 'UnexpectedSuccess'
         testinfo.test_exception_message = ('Unexpected success: This test was marked as expected failure but passed, '
                                            'please review it')
+        self._deduplicate(testinfo)
 
         self.unexpectedSuccesses.append((testinfo, 'unexpected success'))
-        self._prepare_callback(testinfo, [], 'unexpected success', 'u')
+        self._prepare_callback(
+            testinfo, [], 'unexpected success', 'u', 'unexpectedSuccesses')
+
+    def printErrors(self):
+        """
+        Writes information about the FAIL or ERROR to the stream, followed by
+        a summary of the repeated tracebacks when they are reported as
+        references.
+        """
+        super(_XMLTestResult, self).printErrors()
+        if self._deduplication != DEDUPLICATE_REFERENCE:
+            return
+        repeated = [
+            payload for payload in
+            self._payloads['test_exception_info'].values()
+            if payload.count > 1]
+        if not repeated:
+            return
+        repeated.sort(key=lambda payload: -payload.count)
+        self.stream.writeln(self.separator1)
+        self.stream.writeln('REPEATED TRACEBACKS')
+        self.stream.writeln(self.separator2)
+        for payload in repeated:
+            self.stream.writeln('%d tests: %s' % (
+                payload.count, payload.reference()))
+            self.stream.writeln(
+                '    %s' % payload.text.rstrip().rpartition('\n')[2])
+        self.stream.flush()
 
     def printErrorList(self, flavour, errors):
         """
@@ -458,17 +1987,61 @@ class _XMLTestResult(TextTestResult):
             self.stream.writeln('%s' % test_info.get_error_info())
             self.stream.flush()
 
+    def _group_test(self, test_info, report_list):
+        """
+        Adds `test_info`, reported with the result list of index
+        `report_list`, to its testsuite.
+        """
+        suite = self._testsuites.get(test_info.test_name)
+        if suite is None:
+            suite = _GroupedTestSuite((report_list, self._grouped_tests))
+            self._testsuites[test_info.test_name] = suite
+        suite.order = min(suite.order, (report_list, self._grouped_tests))
+        suite.add(test_info, report_list)
+        self._grouped_tests += 1
+
+    def _grouped_testsuites(self):
+        """
+        Returns the testsuites grouped as tests were added, in the order of
+        `_get_info_by_testcase`, or None if the result lists were changed
+        directly.
+        """
+        listed = sum(len(getattr(self, report_list))
+                     for report_list in self._report_lists)
+        if listed != self._grouped_tests:
+            return None
+        return dict(sorted(self._testsuites.items(),
+                           key=lambda item: item[1].order))
+
+    def testsuite_summaries(self):
+        """
+        Returns the totals of each testsuite for the tests added so far, as
+        `_TestSuiteSummary` objects, or None if the result lists were changed
+        directly. This can be used to show live summaries during the run.
+        """
+        if self._report_spool is not None:
+            suites = self._report_spool.suites()
+        else:
+            suites = self._grouped_testsuites()
+            if suites is None:
+                return None
+        return dict((name, suite.summary) for name, suite in suites.items())
+
     def _get_info_by_testcase(self):
         """
         Organizes test results by TestCase module. This information is
         used during the report generation, where a XML report will be created
         for each TestCase.
         """
+        suites = self._grouped_testsuites()
+        if suites is not None:
+            return dict((name, suite.all_tests())
+                        for name, suite in suites.items())
+
         tests_by_testcase = {}
 
-        for tests in (self.successes, self.failures, self.errors,
-                      self.skipped, self.expectedFailures, self.unexpectedSuccesses):
-            for test_info in tests:
+        for report_list in self._report_lists:
+            for test_info in getattr(self, report_list):
                 if isinstance(test_info, tuple):
                     # This is a skipped, error or a failure test case
                     test_info = test_info[0]
@@ -491,10 +2064,10 @@ class _XMLTestResult(TextTestResult):
 
     _report_testsuite_properties = staticmethod(_report_testsuite_properties)
 
-    def _report_testsuite(suite_name, tests, xml_document, parentElement,
-                          properties):
+    def _report_testsuite_header(suite_name, summary, xml_document,
+                                 parentElement, properties):
         """
-        Appends the testsuite section to the XML document.
+        Appends a testsuite section without testcases to the XML document.
         """
         testsuite = xml_document.createElement('testsuite')
         parentElement.appendChild(testsuite)
@@ -502,30 +2075,39 @@ class _XMLTestResult(TextTestResult):
         file_name = module_name.replace('.', '/') + '.py'
 
         testsuite.setAttribute('name', suite_name)
-        testsuite.setAttribute('tests', str(len(tests)))
+        testsuite.setAttribute('tests', str(summary.tests))
         testsuite.setAttribute('file', file_name)
 
-        testsuite.setAttribute(
-            'time', '%.3f' % sum(map(lambda e: e.elapsed_time, tests))
-        )
-        if tests:
-            testsuite.setAttribute(
-                'timestamp', max(map(lambda e: e.timestamp, tests))
-            )
-        failures = filter(lambda e: e.outcome == e.FAILURE, tests)
-        testsuite.setAttribute('failures', str(len(list(failures))))
-
-        errors = filter(lambda e: e.outcome == e.ERROR, tests)
-        testsuite.setAttribute('errors', str(len(list(errors))))
-
-        skips = filter(lambda e: e.outcome == _TestInfo.SKIP, tests)
-        testsuite.setAttribute('skipped', str(len(list(skips))))
+        testsuite.setAttribute('time', '%.3f' % summary.time)
+        if summary.tests:
+            testsuite.setAttribute('timestamp', summary.timestamp)
+        testsuite.setAttribute('failures', str(summary.failures))
+        testsuite.setAttribute('errors', str(summary.errors))
+        testsuite.setAttribute('skipped', str(summary.skipped))
 
         _XMLTestResult._report_testsuite_properties(
             testsuite, xml_document, properties)
 
+        return testsuite
+
+    _report_testsuite_header = staticmethod(_report_testsuite_header)
+
+    def _report_testsuite(suite_name, tests, xml_document, parentElement,
+                          properties, summary=None, report_names=None):
+        """
+        Appends the testsuite section to the XML document. The totals are
+        computed from `tests` unless their `summary` is given.
+        """
+        if summary is None:
+            summary = _TestSuiteSummary(tests)
+        if report_names is None:
+            report_names = _ReportNames()
+        testsuite = _XMLTestResult._report_testsuite_header(
+            suite_name, summary, xml_document, parentElement, properties)
+
         for test in tests:
-            _XMLTestResult._report_testcase(test, testsuite, xml_document)
+            _XMLTestResult._report_testcase(
+                test, testsuite, xml_document, report_names)
 
         return testsuite
 
@@ -544,30 +2126,26 @@ class _XMLTestResult(TextTestResult):
     _test_method_name = staticmethod(_test_method_name)
 
     def _createCDATAsections(xmldoc, node, text):
-        text = safe_unicode(text)
-        pos = text.find(']]>')
-        while pos >= 0:
-            tmp = text[0:pos+2]
-            cdata = xmldoc.createCDATASection(tmp)
+        if isinstance(text, _SpilledOutput):
+            _append_spilled_output(xmldoc, node, text)
+            return
+        for cdata in xmldoc.createCDATASections(safe_unicode(text)):
             node.appendChild(cdata)
-            text = text[pos+2:]
-            pos = text.find(']]>')
-        cdata = xmldoc.createCDATASection(text)
-        node.appendChild(cdata)
 
     _createCDATAsections = staticmethod(_createCDATAsections)
 
-    def _report_testcase(test_result, xml_testsuite, xml_document):
+    def _report_testcase(test_result, xml_testsuite, xml_document,
+                         report_names=None):
         """
-        Appends a testcase section to the XML document.
+        Appends a testcase section to the XML document. `report_names` is the
+        `_ReportNames` of the run, if any.
         """
+        if report_names is None:
+            report_names = _ReportNames()
         testcase = xml_document.createElement('testcase')
         xml_testsuite.appendChild(testcase)
 
-        class_name = re.sub(r'^__main__.', '', test_result.id())
-
-        # Trick subtest referencing objects
-        class_name = class_name.split(' ')[0].rpartition('.')[0]
+        class_name = report_names.class_name(test_result.id())
 
         testcase.setAttribute('classname', class_name)
         testcase.setAttribute(
@@ -578,7 +2156,7 @@ class _XMLTestResult(TextTestResult):
 
         if test_result.filename is not None:
             # Try to make filename relative to current directory.
-            filename = resolve_filename(test_result.filename)
+            filename = report_names.filename(test_result.filename)
             testcase.setAttribute('file', filename)
 
         if test_result.lineno is not None:
@@ -605,9 +2183,9 @@ class _XMLTestResult(TextTestResult):
                 test_result.test_exception_message
             )
             if test_result.get_error_info():
-                error_info = safe_unicode(test_result.get_error_info())
+                # sanitized by _createCDATAsections
                 _XMLTestResult._createCDATAsections(
-                    xml_document, result_elem, error_info)
+                    xml_document, result_elem, test_result.get_error_info())
 
         if test_result.stdout:
             systemout = xml_document.createElement('system-out')
@@ -623,12 +2201,56 @@ class _XMLTestResult(TextTestResult):
 
     _report_testcase = staticmethod(_report_testcase)
 
+    def _print_report_generated(self, filename):
+        if self.showAll:
+            self.stream.writeln('Generated XML report: {}'.format(filename))
+
+    def _unreported_testsuites(self):
+        """
+        Returns the tests of each testsuite whose report is not written yet,
+        and the summaries of the testsuites if known, once the background
+        writer is done.
+        """
+        self._flush_report_pending()
+        summaries = {}
+        if self._report_spool is not None:
+            all_results = self._report_spool.suites()
+        else:
+            all_results = self._get_info_by_testcase()
+            summaries = self.testsuite_summaries() or {}
+
+        if self._report_writer is not None:
+            for filename in self._report_writer.close():
+                self._print_report_generated(filename)
+            written = self._report_writer.written
+            all_results = dict(
+                (suite, tests) for suite, tests in all_results.items()
+                if suite not in written)
+            self._report_writer = None
+        return all_results, summaries
+
+    def _build_testsuite(self, suite_name, tests, doc, parentElement,
+                         summary):
+        """
+        Appends the testsuite section of `tests` to `parentElement`, from the
+        report spool when streaming.
+        """
+        if self._report_spool is not None:
+            return self._report_spool.report_testsuite(
+                suite_name, tests, doc, parentElement, self.properties
+            )
+        return _XMLTestResult._report_testsuite(
+            suite_name, tests, doc, parentElement, self.properties,
+            summary, self._report_names
+        )
+
     def generate_reports(self, test_runner):
         """
         Generates the XML reports to a given XMLTestRunner object.
         """
-        from xml.dom.minidom import Document
-        all_results = self._get_info_by_testcase()
+        all_results, summaries = self._unreported_testsuites()
+
+        Document = document_class(test_runner.report_backend)
 
         outputHandledAsString = \
             isinstance(test_runner.output, str)
@@ -636,6 +2258,11 @@ class _XMLTestResult(TextTestResult):
         if (outputHandledAsString and not os.path.exists(test_runner.output)):
             os.makedirs(test_runner.output)
 
+        if (outputHandledAsString and test_runner.report_workers and
+                self._report_spool is None):
+            self._generate_reports_concurrently(all_results, test_runner)
+            return
+
         if not outputHandledAsString:
             doc = Document()
             testsuite = doc.createElement('testsuites')
@@ -647,41 +2274,94 @@ class _XMLTestResult(TextTestResult):
                 doc = Document()
                 parentElement = doc
 
-            suite_name = suite
-            if test_runner.outsuffix:
-                # not checking with 'is not None', empty means no suffix.
-                suite_name = '%s-%s' % (suite, test_runner.outsuffix)
+            suite_name = _testsuite_name(suite, test_runner)
 
             # Build the XML file
-            testsuite = _XMLTestResult._report_testsuite(
-                suite_name, tests, doc, parentElement, self.properties
-            )
+            self._build_testsuite(
+                suite_name, tests, doc, parentElement, summaries.get(suite))
 
             if outputHandledAsString:
-                xml_content = doc.toprettyxml(
-                    indent='\t',
-                    encoding=test_runner.encoding
-                )
                 filename = path.join(
                     test_runner.output,
-                    'TEST-%s.xml' % suite_name)
+                    'TEST-%s.xml%s' % (
+                        suite_name, filename_suffix(test_runner.compress)))
                 with open(filename, 'wb') as report_file:
-                    report_file.write(xml_content)
+                    self._write_report(doc, report_file, test_runner)
 
-                if self.showAll:
-                    self.stream.writeln('Generated XML report: {}'.format(filename))
+                self._print_report_generated(filename)
 
         if not outputHandledAsString:
             # Assume that test_runner.output is a stream
-            xml_content = doc.toprettyxml(
-                indent='\t',
-                encoding=test_runner.encoding
-            )
-            test_runner.output.write(xml_content)
+            self._write_report(doc, test_runner.output, test_runner)
+
+        if self._report_spool is not None:
+            self._report_spool.close()
+            self._report_spool = None
+
+    def _generate_reports_concurrently(self, all_results, test_runner):
+        """
+        Builds and writes the report file of each testsuite in a pool of
+        `test_runner.report_workers` threads, or processes if
+        `test_runner.report_executor` is 'process'.
+        """
+        if test_runner.report_executor == 'process':
+            executor_class = ProcessPoolExecutor
+        elif test_runner.report_executor == 'thread':
+            executor_class = ThreadPoolExecutor
+        else:
+            raise ValueError(
+                'unknown report executor: %r' % (test_runner.report_executor,))
+        settings = _ReportSettings(test_runner)
+
+        with executor_class(test_runner.report_workers) as executor:
+            futures = []
+            for suite, tests in all_results.items():
+                filename, suite_name = _testsuite_report_name(
+                    suite, test_runner)
+                futures.append(executor.submit(
+                    _write_testsuite_report, filename, suite_name, tests,
+                    self.properties, settings, self._report_names))
+
+            for future in futures:
+                filename = future.result()
+                self._print_report_generated(filename)
+
+    def _write_report(self, doc, stream, test_runner):
+        """
+        Serializes a XML report document to a binary stream.
+        """
+        xml_content = _report_content(doc, test_runner)
+        with _report_stream(stream, test_runner) as stream:
+            if self._report_spool is not None:
+                self._report_spool.write(xml_content, stream)
+            else:
+                _write_content(
+                    xml_content, stream, doc, test_runner.encoding)
 
     def _exc_info_to_string(self, err, test):
         """Converts a sys.exc_info()-style tuple of values into a string."""
-        return super(_XMLTestResult, self)._exc_info_to_string(err, test)
+        if (self._traceback_formatter is None or
+                not hasattr(self, '_clean_tracebacks')):
+            return super(_XMLTestResult, self)._exc_info_to_string(err, test)
+
+        # same as TestResult._exc_info_to_string, with bounded formatting
+        exctype, value, tb = err
+        tb = self._clean_tracebacks(exctype, value, tb, test)
+        msgLines = [self._traceback_formatter.format(
+            exctype, value, tb, self.tb_locals)]
+
+        if self.buffer:
+            output = sys.stdout.getvalue()
+            error = sys.stderr.getvalue()
+            if output:
+                if not output.endswith('\n'):
+                    output += '\n'
+                msgLines.append(STDOUT_LINE % output)
+            if error:
+                if not error.endswith('\n'):
+                    error += '\n'
+                msgLines.append(STDERR_LINE % error)
+        return ''.join(msgLines)
 
     def getDescription(self, test):
         if isinstance(test, tuple):
@@ -4,13 +4,21 @@ import sys
 import time
 
 from .unittest import TextTestRunner, TestProgram
-from .result import _XMLTestResult
+from .result import DEDUPLICATIONS, _XMLTestResult
+from .compression import COMPRESSIONS, check_compression
 
 # see issue #74, the encoding name needs to be one of
 # http://www.iana.org/assignments/character-sets/character-sets.xhtml
 UTF8 = 'UTF-8'
 
 
+def _timestamp_suffix():
+    """
+    Returns the default suffix of the reports, the time of the run.
+    """
+    return time.strftime("%Y%m%d%H%M%S")
+
+
 class XMLTestRunner(TextTestRunner):
     """
     A test runner class that outputs the results in JUnit like XML files.
@@ -18,7 +26,13 @@ class XMLTestRunner(TextTestRunner):
 
     def __init__(self, output='.', outsuffix=None,
                  elapsed_times=True, encoding=UTF8,
-                 resultclass=None,
+                 resultclass=None, streaming=False, report_backend=None,
+                 report_workers=None, report_executor='thread',
+                 background_writer=False, pretty=True, compress=None,
+                 output_spill_threshold=None, output_head_size=None,
+                 output_tail_size=None, deduplicate=None,
+                 tb_max_frames=None, tb_max_local_repr=None,
+                 tb_max_size=None, capture_fd=False, async_concurrency=None,
                  **kwargs):
         super(XMLTestRunner, self).__init__(**kwargs)
         self.output = output
@@ -26,9 +40,64 @@ class XMLTestRunner(TextTestRunner):
         # None means default timestamped suffix
         # '' (empty) means no suffix
         if outsuffix is None:
-            outsuffix = time.strftime("%Y%m%d%H%M%S")
+            outsuffix = _timestamp_suffix()
         self.outsuffix = outsuffix
         self.elapsed_times = elapsed_times
+        # write testcases to a spool file as they finish, see
+        # _XMLTestResult.stream_reports
+        self.streaming = streaming
+        # 'lxml' or 'minidom', lxml is used by default when installed
+        self.report_backend = report_backend
+        # write the report files of a directory output concurrently,
+        # using a pool of 'thread' or 'process' workers
+        self.report_workers = report_workers
+        self.report_executor = report_executor
+        # write the report file of each testsuite of a directory output
+        # while the following tests run
+        if streaming and background_writer:
+            raise ValueError(
+                'streaming and background_writer cannot be used together')
+        self.background_writer = background_writer
+        # indent the XML reports, compact reports are smaller and faster
+        # to write
+        self.pretty = pretty
+        # 'gzip', 'xz' or 'bz2' to compress the reports while they are
+        # written, report files get a '.gz', '.xz' or '.bz2' suffix
+        check_compression(compress)
+        self.compress = compress
+        # captured output longer than this many characters is moved to a
+        # temporary file instead of being kept in memory
+        self.output_spill_threshold = output_spill_threshold
+        # only keep the first and last characters of the captured output of
+        # each test, the characters in between are dropped
+        if output_spill_threshold is not None and (
+                output_head_size is not None or output_tail_size is not None):
+            raise ValueError(
+                'output_spill_threshold and output_head_size/output_tail_size '
+                'cannot be used together')
+        self.output_head_size = output_head_size
+        self.output_tail_size = output_tail_size
+        # 'memory' to keep identical tracebacks and outputs of tests once
+        # in memory, 'reference' to also report the repeated ones as a
+        # reference to the first test having them
+        if deduplicate is not None and deduplicate not in DEDUPLICATIONS:
+            raise ValueError('unknown deduplication: %r' % (deduplicate,))
+        self.deduplicate = deduplicate
+        # bound the formatting of tracebacks: number of innermost frames
+        # kept, characters of the repr of each local variable (with
+        # tb_locals) and characters kept of each traceback
+        self.tb_max_frames = tb_max_frames
+        self.tb_max_local_repr = tb_max_local_repr
+        self.tb_max_size = tb_max_size
+        # capture the output written to the file descriptors 1 and 2, e.g.
+        # by C extensions and child processes
+        self.capture_fd = capture_fd
+        # run up to this many tests of an IsolatedAsyncioTestCase class at
+        # once, in threads
+        if capture_fd and async_concurrency:
+            raise ValueError(
+                'capture_fd and async_concurrency cannot be used together')
+        self.async_concurrency = async_concurrency
         if resultclass is None:
             self.resultclass = _XMLTestResult
         else:
@@ -44,6 +113,52 @@ class XMLTestRunner(TextTestRunner):
             self.stream, self.descriptions, self.verbosity, self.elapsed_times
         )
 
+    def _setup_result(self, result):
+        """
+        Applies the options about how the tests are run and their output is
+        captured to `result`.
+        """
+        result.failfast = self.failfast
+        result.buffer = self.buffer
+        result.tb_locals = self.tb_locals
+        if (self.output_head_size is not None or
+                self.output_tail_size is not None):
+            result.limit_output(self.output_head_size or 0,
+                                self.output_tail_size or 0)
+        if (self.tb_max_frames is not None or
+                self.tb_max_local_repr is not None or
+                self.tb_max_size is not None):
+            result.limit_tracebacks(self.tb_max_frames,
+                                    self.tb_max_local_repr,
+                                    self.tb_max_size)
+        if self.capture_fd:
+            result.capture_fds()
+
+    def _setup_reports(self, result):
+        """
+        Applies the options about how the tests of `result` are kept and
+        reported.
+        """
+        if self.streaming:
+            result.stream_reports(self)
+        if self.background_writer:
+            result.write_reports_in_background(self)
+        if self.output_spill_threshold is not None:
+            result.spill_output(self.output_spill_threshold)
+        if self.deduplicate is not None:
+            result.deduplicate_payloads(self.deduplicate)
+
+    def _run_tests(self, test, result):
+        """
+        Runs the given test case or test suite, adding its tests to `result`.
+        """
+        if self.async_concurrency:
+            # imported here, the parallel runner extends this module
+            from .parallel import _run_async_concurrently
+            _run_async_concurrently(self, test, result)
+            return
+        test(result)
+
     def run(self, test):
         """
         Runs the given test case or test suite.
@@ -51,11 +166,11 @@ class XMLTestRunner(TextTestRunner):
         try:
             # Prepare the test execution
             result = self._make_result()
-            result.failfast = self.failfast
-            result.buffer = self.buffer
+            self._setup_result(result)
             if hasattr(test, 'properties'):
                 # junit testsuite properties
                 result.properties = test.properties
+            self._setup_reports(result)
 
             # Print a nice header
             self.stream.writeln()
@@ -64,7 +179,7 @@ class XMLTestRunner(TextTestRunner):
 
             # Execute tests
             start_time = time.monotonic()
-            test(result)
+            self._run_tests(test, result)
             stop_time = time.monotonic()
             time_taken = stop_time - start_time
 
@@ -142,12 +257,103 @@ class XMLTestProgram(TestProgram):
         parser.add_argument(
             '--outsuffix', metavar='STRING',
             help='Output suffix (timestamp is default)')
+        parser.add_argument(
+            '--report-workers', metavar='N', type=int,
+            help='Number of threads writing the XML reports of a directory')
+        parser.add_argument(
+            '--compact', action='store_true',
+            help='Write XML reports without indentation')
+        parser.add_argument(
+            '--compress', choices=COMPRESSIONS,
+            help='Compress XML reports while writing them')
+        parser.add_argument(
+            '--deduplicate', choices=DEDUPLICATIONS,
+            help='Keep identical tracebacks and outputs once, or report '
+                 'repeats as references')
+        parser.add_argument(
+            '--tb-max-frames', metavar='N', type=int,
+            help='Only format the N innermost frames of tracebacks')
+        parser.add_argument(
+            '--tb-max-local-repr', metavar='N', type=int,
+            help='Limit the repr of local variables in tracebacks to N '
+                 'characters')
+        parser.add_argument(
+            '--tb-max-size', metavar='N', type=int,
+            help='Keep only the first and last N/2 characters of tracebacks')
+        parser.add_argument(
+            '--capture-fd', action='store_true',
+            help='Capture the output written to the file descriptors 1 and 2')
+        parser.add_argument(
+            '--async-concurrency', metavar='N', type=int,
+            help='Run up to N tests of an IsolatedAsyncioTestCase class at '
+                 'once')
+        parser.add_argument(
+            '--workers', metavar='N', type=int,
+            help='Run the tests in N worker processes')
+        parser.add_argument(
+            '--executor', choices=('process', 'thread'),
+            help='Run the --workers in processes (default) or threads')
+        parser.add_argument(
+            '--shard-index', metavar='I', type=int,
+            help='Only run the shard I (from 0) of --shard-count shards')
+        parser.add_argument(
+            '--shard-count', metavar='N', type=int,
+            help='Split the tests in N shards balanced on their number, or '
+                 'on --shard-history')
+        parser.add_argument(
+            '--shard-history', metavar='PATH',
+            help='Report file or directory of earlier reports, the same for '
+                 'all shards, balancing the shards on their durations')
         namespace, argv = parser.parse_known_args(argv)
+        if namespace.workers is not None:
+            if namespace.workers < 1:
+                parser.error('--workers must be at least 1')
+            if (namespace.workers > 1 and
+                    not self._runs_workers(kwargs['testRunner'])):
+                parser.error('--workers requires XMLTestRunner or an '
+                             'XMLParallelTestRunner as test runner')
+        if (namespace.shard_index is None) != (namespace.shard_count is None):
+            parser.error('--shard-index and --shard-count must be used '
+                         'together')
+        if namespace.shard_count is not None:
+            # imported here, the sharding module and the parallel runner it
+            # uses are only loaded to run a shard
+            from .sharding import check_shard
+            try:
+                check_shard(namespace.shard_index, namespace.shard_count)
+            except ValueError as e:
+                parser.error(str(e))
         self.output = namespace.output
         self.output_file = namespace.output_file
         self.outsuffix = namespace.outsuffix
+        self.report_workers = namespace.report_workers
+        self.compact = namespace.compact
+        self.compress = namespace.compress
+        self.deduplicate = namespace.deduplicate
+        self.tb_max_frames = namespace.tb_max_frames
+        self.tb_max_local_repr = namespace.tb_max_local_repr
+        self.tb_max_size = namespace.tb_max_size
+        self.capture_fd = namespace.capture_fd
+        self.async_concurrency = namespace.async_concurrency
+        self.workers = namespace.workers
+        self.executor = namespace.executor
+        self.shard_index = namespace.shard_index
+        self.shard_count = namespace.shard_count
+        self.shard_history = namespace.shard_history
         kwargs['argv'] = argv
 
+    @staticmethod
+    def _runs_workers(test_runner):
+        """
+        Tells whether `test_runner` can run the tests in --workers.
+        """
+        if test_runner is XMLTestRunner:
+            return True
+        # imported here, the parallel runner extends this module
+        from .parallel import XMLParallelTestRunner
+        return (isinstance(test_runner, type) and
+                issubclass(test_runner, XMLParallelTestRunner))
+
     def _initArgParsers(self):
         # this code path is only called in python3 (optparse vs argparse)
         super(XMLTestProgram, self)._initArgParsers()
@@ -163,8 +369,90 @@ class XMLTestProgram(TestProgram):
             group.add_argument(
                 '--outsuffix', metavar='STRING', nargs=1,
                 help='Output suffix (timestamp is default)')
+            parser.add_argument(
+                '--report-workers', metavar='N', type=int, nargs=1,
+                help='Number of threads writing the XML reports of a '
+                     'directory')
+            parser.add_argument(
+                '--compact', action='store_true',
+                help='Write XML reports without indentation')
+            parser.add_argument(
+                '--compress', choices=COMPRESSIONS, nargs=1,
+                help='Compress XML reports while writing them')
+            parser.add_argument(
+                '--deduplicate', choices=DEDUPLICATIONS, nargs=1,
+                help='Keep identical tracebacks and outputs once, or report '
+                     'repeats as references')
+            parser.add_argument(
+                '--tb-max-frames', metavar='N', type=int, nargs=1,
+                help='Only format the N innermost frames of tracebacks')
+            parser.add_argument(
+                '--tb-max-local-repr', metavar='N', type=int, nargs=1,
+                help='Limit the repr of local variables in tracebacks to N '
+                     'characters')
+            parser.add_argument(
+                '--tb-max-size', metavar='N', type=int, nargs=1,
+                help='Keep only the first and last N/2 characters of '
+                     'tracebacks')
+            parser.add_argument(
+                '--capture-fd', action='store_true',
+                help='Capture the output written to the file descriptors 1 '
+                     'and 2')
+            parser.add_argument(
+                '--async-concurrency', metavar='N', type=int, nargs=1,
+                help='Run up to N tests of an IsolatedAsyncioTestCase class '
+                     'at once')
+            parser.add_argument(
+                '--workers', metavar='N', type=int, nargs=1,
+                help='Run the tests in N worker processes')
+            parser.add_argument(
+                '--executor', choices=('process', 'thread'), nargs=1,
+                help='Run the --workers in processes (default) or threads')
+            parser.add_argument(
+                '--shard-index', metavar='I', type=int, nargs=1,
+                help='Only run the shard I (from 0) of --shard-count shards')
+            parser.add_argument(
+                '--shard-count', metavar='N', type=int, nargs=1,
+                help='Split the tests in N shards balanced on their '
+                     'number, or on --shard-history')
+            parser.add_argument(
+                '--shard-history', metavar='PATH', nargs=1,
+                help='Report file or directory of earlier reports, the same '
+                     'for all shards, balancing the shards on their '
+                     'durations')
 
-    def runTests(self):
+    def _shard_tests(self):
+        """
+        Keeps the tests of the shard `shard_index` of `shard_count`, and
+        returns the suffix of the reports of the shard, appended to
+        `outsuffix` or the default timestamp.
+
+        The shards are balanced on the durations of the reports in
+        `shard_history` if given, else on the number of tests: the reports
+        in the output directory of a node are those of its own shard, other
+        nodes would not read the same durations.
+        """
+        # imported here, see _parseKnownArgs
+        from .sharding import read_durations, shard_suffix, shard_suite
+        durations = None
+        if self.shard_history is not None:
+            durations = read_durations(self.shard_history)
+        self.test = shard_suite(self.test, self.shard_index, self.shard_count,
+                                durations)
+        # the reports of the shards are merged, their names must differ
+        suffix = shard_suffix(self.shard_index, self.shard_count)
+        outsuffix = self.outsuffix
+        if outsuffix is None:
+            outsuffix = _timestamp_suffix()
+        if outsuffix:
+            suffix = '%s-%s' % (outsuffix, suffix)
+        return suffix
+
+    def _runner_kwargs(self):
+        """
+        Returns the arguments of the test runner given by the command line
+        options, but the output and the workers.
+        """
         kwargs = dict(
             verbosity=self.verbosity,
             failfast=self.failfast,
@@ -174,6 +462,37 @@ class XMLTestProgram(TestProgram):
         if sys.version_info[:2] > (3, 4):
             kwargs.update(tb_locals=self.tb_locals)
 
+        if self.shard_count is not None:
+            kwargs.update(outsuffix=self._shard_tests())
+        elif self.outsuffix is not None:
+            kwargs.update(outsuffix=self.outsuffix)
+
+        for name in ('report_workers', 'compress', 'deduplicate',
+                     'tb_max_frames', 'tb_max_local_repr', 'tb_max_size',
+                     'async_concurrency'):
+            if getattr(self, name) is not None:
+                kwargs[name] = getattr(self, name)
+
+        if self.compact:
+            kwargs.update(pretty=False)
+
+        if self.capture_fd:
+            kwargs.update(capture_fd=True)
+        return kwargs
+
+    def runTests(self):
+        kwargs = self._runner_kwargs()
+
+        # a single worker runs the tests in this process
+        if self.workers is not None and self.workers > 1:
+            kwargs.update(workers=self.workers)
+            if self.executor is not None:
+                kwargs.update(executor=self.executor)
+            if self.testRunner is XMLTestRunner:
+                # imported here, the parallel runner extends this module
+                from .parallel import XMLParallelTestRunner
+                self.testRunner = XMLParallelTestRunner
+
         output_file = None
         try:
             if self.output_file is not None:
@@ -182,9 +501,6 @@ class XMLTestProgram(TestProgram):
             elif self.output is not None:
                 kwargs.update(output=self.output)
 
-            if self.outsuffix is not None:
-                kwargs.update(outsuffix=self.outsuffix)
-
             self.testRunner = self.testRunner(**kwargs)
             super(XMLTestProgram, self).runTests()
         finally:
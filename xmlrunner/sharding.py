@@ -0,0 +1,149 @@
+"""
+Splitting of a test suite in shards, run by separate CI nodes.
+
+The tests are partitioned by class, so that the class fixtures of a shard run
+once, and the classes are balanced on the time their tests took in earlier
+reports: each node computes the same partition from the same reports and
+keeps its own part of it.
+"""
+
+import os
+import unittest
+from glob import glob
+from xml.etree import ElementTree
+
+from .compression import decompress, lzma
+from .parallel import _iter_tests
+from .result import _ReportNames
+
+
+__all__ = ('shard_suffix', 'check_shard', 'read_durations', 'shard_suite')
+
+
+# errors of the reports that cannot be read back
+_READ_ERRORS = (OSError, EOFError, ValueError, ElementTree.ParseError) + (
+    (lzma.LZMAError,) if lzma is not None else ())
+
+
+def shard_suffix(index, count):
+    """
+    Returns the suffix of the reports of the shard `index` of `count`, so
+    that the reports of the shards of a run never overwrite each other.
+    """
+    return 'shard%dof%d' % (index, count)
+
+
+def check_shard(index, count):
+    """
+    Raises ValueError if `index` is not the index of one of `count` shards.
+    """
+    if count < 1:
+        raise ValueError('shard count must be at least 1: %r' % (count,))
+    if not 0 <= index < count:
+        raise ValueError('shard index must be between 0 and %d: %r' % (
+            count - 1, index))
+
+
+def _report_files(path):
+    """
+    Returns the reports in `path`, a report file or a directory of
+    TEST-*.xml reports, compressed or not.
+    """
+    if os.path.isdir(path):
+        return sorted(glob(os.path.join(path, 'TEST-*.xml*')))
+    if os.path.isfile(path):
+        return [path]
+    return []
+
+
+def read_durations(path):
+    """
+    Returns the time taken by the tests of each class in the reports in
+    `path`, a report file or a directory of TEST-*.xml reports, keyed by the
+    `classname` attribute of their testcases.
+
+    The time of a class reported several times, by the reports of several
+    runs, is the average of its reports. Unreadable reports are ignored.
+    """
+    reports = {}
+    for filename in _report_files(path):
+        try:
+            with open(filename, 'rb') as report_file:
+                root = ElementTree.fromstring(decompress(report_file.read()))
+        except _READ_ERRORS:
+            continue
+        times = {}
+        for testcase in root.iter('testcase'):
+            try:
+                elapsed = float(testcase.get('time', ''))
+            except ValueError:
+                continue
+            class_name = testcase.get('classname', '')
+            times[class_name] = times.get(class_name, 0.0) + elapsed
+        for class_name, elapsed in times.items():
+            reports.setdefault(class_name, []).append(elapsed)
+    return dict(
+        (class_name, sum(times) / len(times))
+        for class_name, times in reports.items())
+
+
+def _class_groups(suite):
+    """
+    Returns the tests of `suite` grouped by the class name they are reported
+    with, in the order the classes are first found.
+    """
+    groups = {}
+    report_names = _ReportNames()
+    for test in _iter_tests(suite):
+        groups.setdefault(report_names.class_name(test.id()), []).append(test)
+    return groups
+
+
+def _partition(groups, count, durations):
+    """
+    Returns the sets of class names of `groups` assigned to each of `count`
+    shards, the longest classes first each to the shard with the least time.
+
+    Classes missing from `durations` are weighed with the average time of a
+    test in `durations`; without any duration the shards are balanced on
+    the number of tests.
+    """
+    known = [name for name in groups if name in durations]
+    known_tests = sum(len(groups[name]) for name in known)
+    test_time = (
+        sum(durations[name] for name in known) / known_tests
+        if known_tests else 1.0)
+
+    weights = []
+    for name, tests in groups.items():
+        weight = durations.get(name)
+        if weight is None:
+            weight = len(tests) * test_time
+        weights.append((-weight, -len(tests), name))
+    weights.sort()
+
+    loads = [(0.0, 0, index) for index in range(count)]
+    shards = [set() for _ in range(count)]
+    for weight, tests, name in weights:
+        load, load_tests, index = min(loads)
+        loads[index] = (load - weight, load_tests - tests, index)
+        shards[index].add(name)
+    return shards
+
+
+def shard_suite(suite, index, count, durations=None):
+    """
+    Returns a suite of the tests of the shard `index` of `count` shards of
+    `suite`, in the order of `suite`.
+
+    The tests of a class all go to the same shard. The shards are balanced on
+    `durations`, the time of the tests of each class as returned by
+    `read_durations`: every shard must be computed with the same durations to
+    get disjoint shards.
+    """
+    check_shard(index, count)
+    groups = _class_groups(suite)
+    selected = _partition(groups, count, durations or {})[index]
+    return unittest.TestSuite(
+        unittest.TestSuite(tests)
+        for name, tests in groups.items() if name in selected)